@@ -1,5 +1,8 @@
 const API_BASE_URL = "/api";
 
+// Server-side limit per order item (schemas.MAX_ITEM_QUANTITY)
+export const MAX_ITEM_QUANTITY = 99;
+
 // Types
 export interface Drink {
   id: string;
@@ -16,6 +19,14 @@ export interface Option {
   price: number;
 }
 
+export interface Menu {
+  version: string;
+  drinks: Drink[];
+  beans: Option[];
+  milk: Option[];
+  syrups: Option[];
+}
+
 export interface CartItem {
   drink: Drink;
   customization: {
@@ -61,10 +72,20 @@ export interface Order {
   user_id: string;
   total: number;
   points_earned: number;
+  points_redeemed: number;
   created_at: string;
   items: OrderItem[];
 }
 
+export interface PointsEntry {
+  id: number;
+  delta: number;
+  reason: "order" | "redeem" | "adjustment" | "opening";
+  order_id: string | null;
+  created_at: string;
+  balance: number;
+}
+
 export interface OrderHistory {
   id: string;
   date: string;
@@ -113,6 +134,12 @@ async function handleResponse<T>(response: Response): Promise<T> {
   return response.json();
 }
 
+// Menu API
+export async function getMenu(): Promise<Menu> {
+  const response = await fetch(`${API_BASE_URL}/menu`);
+  return handleResponse<Menu>(response);
+}
+
 // Drinks API
 export async function getDrinks(): Promise<Drink[]> {
   const response = await fetch(`${API_BASE_URL}/drinks`);
@@ -175,24 +202,48 @@ export async function getUserProfile(id: string): Promise<UserProfile> {
   return handleResponse<UserProfile>(response);
 }
 
+export async function getPointsHistory(
+  userId: string,
+  cursor?: string
+): Promise<{ entries: PointsEntry[]; nextCursor: string | null }> {
+  const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+  const response = await fetch(`${API_BASE_URL}/users/${userId}/points/history${params}`);
+  const entries = await handleResponse<PointsEntry[]>(response);
+  return { entries, nextCursor: response.headers.get("X-Next-Cursor") };
+}
+
 export async function createOrder(
   userId: string,
-  items: OrderItemCreate[]
+  items: OrderItemCreate[],
+  pointsToRedeem = 0,
+  idempotencyKey: string = crypto.randomUUID(),
+  retries = 2
 ): Promise<Order> {
   const total = items.reduce((sum, item) => sum + item.price * item.quantity, 0);
   const points_earned = Math.floor(total * 0.1);
 
-  const response = await fetch(`${API_BASE_URL}/users/${userId}/orders`, {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({
-      user_id: userId,
-      total,
-      points_earned,
-      items,
-    }),
-  });
-  return handleResponse<Order>(response);
+  // Network failures are retried with the same Idempotency-Key, so the
+  // server creates the order at most once
+  for (let attempt = 0; ; attempt++) {
+    let response: Response;
+    try {
+      response = await fetch(`${API_BASE_URL}/users/${userId}/orders`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", "Idempotency-Key": idempotencyKey },
+        body: JSON.stringify({
+          user_id: userId,
+          total,
+          points_earned,
+          points_to_redeem: pointsToRedeem,
+          items,
+        }),
+      });
+    } catch (error) {
+      if (attempt >= retries) throw error;
+      continue;
+    }
+    return handleResponse<Order>(response);
+  }
 }
 
 // Admin API
@@ -205,18 +256,43 @@ export async function loginAdmin(username: string, password: string): Promise<{
   return handleResponse<{ access_token: string }>(response);
 }
 
-export async function getAllOrders(token: string): Promise<Order[]> {
-  const response = await fetch(`${API_BASE_URL}/admin/orders`, {
+export interface Page<T> {
+  items: T[];
+  nextCursor: string | null;
+}
+
+export interface DashboardSummary {
+  orders: number;
+  items: number;
+  revenue: number;
+  avg_items_per_order: number;
+  avg_order_value: number;
+  users: number;
+}
+
+// Admin listings return one page; pass the previous page's nextCursor for the next
+async function getAdminPage<T>(path: string, token: string, cursor?: string): Promise<Page<T>> {
+  const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+  const response = await fetch(`${API_BASE_URL}/admin/${path}${params}`, {
     headers: { "Authorization": `Bearer ${token}` },
   });
-  return handleResponse<Order[]>(response);
+  const items = await handleResponse<T[]>(response);
+  return { items, nextCursor: response.headers.get("X-Next-Cursor") };
+}
+
+export function getAllOrders(token: string, cursor?: string): Promise<Page<Order>> {
+  return getAdminPage<Order>("orders", token, cursor);
+}
+
+export function getAllUsers(token: string, cursor?: string): Promise<Page<User>> {
+  return getAdminPage<User>("users", token, cursor);
 }
 
-export async function getAllUsers(token: string): Promise<User[]> {
-  const response = await fetch(`${API_BASE_URL}/admin/users`, {
+export async function getDashboardSummary(token: string): Promise<DashboardSummary> {
+  const response = await fetch(`${API_BASE_URL}/admin/analytics/summary`, {
     headers: { "Authorization": `Bearer ${token}` },
   });
-  return handleResponse<User[]>(response);
+  return handleResponse<DashboardSummary>(response);
 }
 
 export async function updateDrink(
@@ -4,6 +4,7 @@ import { useAdminAuth } from "../hooks/useAdminAuth";
 import {
   getAllOrders,
   getAllUsers,
+  getDashboardSummary,
   getDrinks,
   updateDrink,
   createDrink,
@@ -11,6 +12,7 @@ import {
   Order,
   User,
   Drink,
+  DashboardSummary,
 } from "../api/api";
 import {
   LogOut,
@@ -31,6 +33,10 @@ export default function AdminDashboard() {
   const [activeTab, setActiveTab] = useState<"orders" | "users" | "drinks">("orders");
   const [orders, setOrders] = useState<Order[]>([]);
   const [users, setUsers] = useState<User[]>([]);
+  const [ordersCursor, setOrdersCursor] = useState<string | null>(null);
+  const [usersCursor, setUsersCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  const [summary, setSummary] = useState<DashboardSummary | null>(null);
   const [drinks, setDrinks] = useState<Drink[]>([]);
   const [isLoading, setIsLoading] = useState(true);
   const [showDrinkForm, setShowDrinkForm] = useState(false);
@@ -57,14 +63,18 @@ export default function AdminDashboard() {
     if (!token) return;
     setIsLoading(true);
     try {
-      const [ordersData, usersData, drinksData] = await Promise.all([
+      const [ordersPage, usersPage, drinksData, summaryData] = await Promise.all([
         getAllOrders(token),
         getAllUsers(token),
         getDrinks(),
+        getDashboardSummary(token),
       ]);
-      setOrders(ordersData);
-      setUsers(usersData);
+      setOrders(ordersPage.items);
+      setOrdersCursor(ordersPage.nextCursor);
+      setUsers(usersPage.items);
+      setUsersCursor(usersPage.nextCursor);
       setDrinks(drinksData);
+      setSummary(summaryData);
     } catch (error) {
       console.error("Failed to load data:", error);
     } finally {
@@ -72,6 +82,34 @@ export default function AdminDashboard() {
     }
   };
 
+  const loadMoreOrders = async () => {
+    if (!token || !ordersCursor) return;
+    setIsLoadingMore(true);
+    try {
+      const page = await getAllOrders(token, ordersCursor);
+      setOrders((current) => [...current, ...page.items]);
+      setOrdersCursor(page.nextCursor);
+    } catch (error) {
+      console.error("Failed to load orders:", error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
+  const loadMoreUsers = async () => {
+    if (!token || !usersCursor) return;
+    setIsLoadingMore(true);
+    try {
+      const page = await getAllUsers(token, usersCursor);
+      setUsers((current) => [...current, ...page.items]);
+      setUsersCursor(page.nextCursor);
+    } catch (error) {
+      console.error("Failed to load users:", error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const handleLogout = () => {
     logout();
     navigate("/admin");
@@ -143,10 +181,10 @@ export default function AdminDashboard() {
     }
   };
 
-  // Stats
-  const totalRevenue = orders.reduce((sum, o) => sum + o.total, 0);
-  const totalOrders = orders.length;
-  const totalUsers = users.length;
+  // Stats cover all orders and users, not just the loaded pages
+  const totalRevenue = summary?.revenue ?? 0;
+  const totalOrders = summary?.orders ?? 0;
+  const totalUsers = summary?.users ?? 0;
 
   if (isAuthLoading || isLoading) {
     return (
@@ -291,6 +329,17 @@ export default function AdminDashboard() {
                 ))
               )}
             </div>
+            {ordersCursor && (
+              <div className="p-4 border-t border-gray-100 text-center">
+                <button
+                  onClick={loadMoreOrders}
+                  disabled={isLoadingMore}
+                  className="px-4 py-2 text-amber-600 font-medium hover:bg-amber-50 rounded-lg transition-colors disabled:opacity-50"
+                >
+                  {isLoadingMore ? "Загрузка..." : "Показать ещё"}
+                </button>
+              </div>
+            )}
           </div>
         )}
 
@@ -323,6 +372,17 @@ export default function AdminDashboard() {
                 </div>
               ))}
             </div>
+            {usersCursor && (
+              <div className="p-4 border-t border-gray-100 text-center">
+                <button
+                  onClick={loadMoreUsers}
+                  disabled={isLoadingMore}
+                  className="px-4 py-2 text-amber-600 font-medium hover:bg-amber-50 rounded-lg transition-colors disabled:opacity-50"
+                >
+                  {isLoadingMore ? "Загрузка..." : "Показать ещё"}
+                </button>
+              </div>
+            )}
           </div>
         )}
 
@@ -2,7 +2,7 @@ import { useNavigate } from "react-router";
 import { useCart } from "../hooks/useCart";
 import { useUser } from "../hooks/useUser";
 import { ArrowLeft, Plus, Minus, Trash2, ShoppingBag } from "lucide-react";
-import { OrderItemCreate } from "../api/api";
+import { MAX_ITEM_QUANTITY, OrderItemCreate } from "../api/api";
 
 export default function Cart() {
   const navigate = useNavigate();
@@ -76,10 +76,10 @@ export default function Cart() {
       }));
 
       // Create order via API
-      await addOrder(orderItems);
+      // Prices and points are computed by the server
+      const order = await addOrder(orderItems);
 
-      const pointsEarned = Math.floor(totalPrice * 0.1);
-      alert(`Заказ оформлен! Спасибо за покупку ☕\nВы получили ${pointsEarned} баллов!`);
+      alert(`Заказ оформлен! Спасибо за покупку ☕\nВы получили ${order.points_earned} баллов!`);
       
       // Clear cart and refresh profile
       clearCart();
@@ -181,7 +181,7 @@ export default function Cart() {
                   {item.quantity}
                 </span>
                 <button
-                  onClick={() => updateQuantity(item.id, item.quantity + 1)}
+                  onClick={() => updateQuantity(item.id, Math.min(MAX_ITEM_QUANTITY, item.quantity + 1))}
                   className="w-8 h-8 bg-amber-100 rounded-full flex items-center justify-center hover:bg-amber-200 transition-colors"
                 >
                   <Plus className="w-4 h-4 text-amber-900" />
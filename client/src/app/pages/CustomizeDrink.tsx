@@ -2,7 +2,7 @@ import { useState, useEffect } from "react";
 import { useNavigate, useParams } from "react-router";
 import { ArrowLeft, ShoppingCart } from "lucide-react";
 import { useCart } from "../hooks/useCart";
-import { getDrink, getBeanOptions, getMilkOptions, getSyrupOptions, Drink, Option } from "../api/api";
+import { getMenu, Drink, Option } from "../api/api";
 
 export default function CustomizeDrink() {
   const navigate = useNavigate();
@@ -22,13 +22,8 @@ export default function CustomizeDrink() {
   useEffect(() => {
     const loadData = async () => {
       try {
-        const [fetchedDrink, beans, milks, syrups] = await Promise.all([
-          getDrink(drinkId!),
-          getBeanOptions(),
-          getMilkOptions(),
-          getSyrupOptions(),
-        ]);
-        setDrink(fetchedDrink);
+        const { drinks, beans, milk: milks, syrups } = await getMenu();
+        setDrink(drinks.find((d) => d.id === drinkId) ?? null);
         setBeanOptions(beans);
         setMilkOptions(milks);
         setSyrupOptions(syrups);
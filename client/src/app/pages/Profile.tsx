@@ -6,7 +6,7 @@ import { useState } from "react";
 
 export default function Profile() {
   const navigate = useNavigate();
-  const { user, orderHistory, isLoading } = useUser();
+  const { user, orderHistory, totalSpent, totalPointsEarned, isLoading } = useUser();
   const [showQR, setShowQR] = useState(false);
 
   // Redirect to login if not authenticated
@@ -48,9 +48,6 @@ export default function Profile() {
     );
   }
 
-  const totalSpent = orderHistory.reduce((sum, order) => sum + order.total, 0);
-  const totalPointsEarned = orderHistory.reduce((sum, order) => sum + order.pointsEarned, 0);
-
   const handleLogout = () => {
     localStorage.removeItem("user_token");
     localStorage.removeItem("user_id");
@@ -0,0 +1,90 @@
+"""
+Caches for the authenticated hot paths.
+
+``decode_token`` remembers verified JWT claims until the token expires (or
+``TOKEN_CACHE_TTL_SECONDS``, whichever is sooner), so repeated requests with
+the same bearer token skip signature verification. ``user_cache`` keeps
+serialized user rows for ``USER_CACHE_TTL_SECONDS``; writers call
+``user_cache.invalidate(user_id)`` after committing a change to the user.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import jwt
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "5"))
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire at a wall-clock time"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: float):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TTLCache(TOKEN_CACHE_SIZE)
+user_cache = TTLCache(USER_CACHE_SIZE if USER_CACHE_TTL_SECONDS > 0 else 0)
+
+
+def decode_token(token: str, secret: str, algorithm: str) -> dict:
+    """jwt.decode with verified claims cached; raises jwt.PyJWTError"""
+    key = (secret, algorithm, token)
+    claims = token_cache.get(key)
+    if claims is not None:
+        return claims
+
+    claims = jwt.decode(token, secret, algorithms=[algorithm])
+    expires_at = time.time() + TOKEN_CACHE_TTL_SECONDS
+    if "exp" in claims:
+        expires_at = min(expires_at, float(claims["exp"]))
+    token_cache.set(key, claims, expires_at)
+    return claims
+
+
+def cache_user(user_id: str, value: Any):
+    user_cache.set(user_id, value, time.time() + USER_CACHE_TTL_SECONDS)
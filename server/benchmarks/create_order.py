@@ -0,0 +1,167 @@
+"""
+Per-order latency of create_order as the number of items grows.
+
+Runs against a throwaway SQLite database, then places concurrent orders
+through the group-commit writer for a user without aggregates yet, and more
+while the writer shuts down. Exits non-zero if any of those orders hangs or
+is lost, or if any user's user_stats differ from the orders actually stored:
+
+    python benchmarks/create_order.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_create_order.db"
+)
+
+from sqlalchemy import func, select  # noqa: E402
+
+import models  # noqa: E402
+import schemas  # noqa: E402
+from database import AsyncSessionLocal, Base, SessionLocal, count_queries, engine  # noqa: E402
+from loyalty import get_user_stats  # noqa: E402
+from menu_cache import menu_cache  # noqa: E402
+from order_queue import PendingOrder, order_batcher  # noqa: E402
+from routes.users import calculate_points, place_order, price_order_items  # noqa: E402
+from seed_data import seed_database  # noqa: E402
+
+ITEM_COUNTS = [1, 5, 10, 25, 50]
+ORDERS_PER_SIZE = 200
+BATCHED_ORDERS = 60
+STOPPING_ORDERS = 20
+STOP_TIMEOUT_SECONDS = 10
+
+
+def single_item_order(user_id: str, item_count: int = 1) -> schemas.OrderCreate:
+    return schemas.OrderCreate(
+        user_id=user_id,
+        total=0,
+        items=[
+            schemas.OrderItemCreate(
+                drink_id="latte",
+                quantity=1,
+                bean_option="arabica",
+                milk_option="oat",
+                syrup_option="vanilla",
+            )
+            for _ in range(item_count)
+        ],
+    )
+
+
+async def place_batched_orders(user_id: str):
+    """Concurrent orders, so the writer commits several of them per batch"""
+    async def place():
+        async with AsyncSessionLocal() as db:
+            await place_order(user_id, single_item_order(user_id), db)
+
+    order_batcher.start()
+    try:
+        await asyncio.gather(*(place() for _ in range(BATCHED_ORDERS)))
+    finally:
+        await order_batcher.stop()
+    return order_batcher.max_batch_size
+
+
+async def place_orders_while_stopping(user_id: str):
+    """Orders submitted after the writer was told to stop must still be written"""
+    snapshot = await menu_cache.aget()
+    orders = []
+    for _ in range(STOPPING_ORDERS):
+        item_rows, total = price_order_items(snapshot, single_item_order(user_id).items)
+        orders.append(PendingOrder(
+            user_id=user_id,
+            total=total,
+            points_earned=calculate_points(total),
+            item_rows=item_rows,
+        ))
+
+    order_batcher.start()
+    stopping = asyncio.ensure_future(order_batcher.stop())
+    # Let stop() queue its sentinel, as a request that checked
+    # order_batcher.running just before shutdown would find it
+    await asyncio.sleep(0)
+    await asyncio.wait_for(
+        asyncio.gather(stopping, *(order_batcher.submit(order) for order in orders)),
+        STOP_TIMEOUT_SECONDS,
+    )
+
+
+async def stats_mismatches() -> list:
+    """Users whose user_stats disagree with their stored orders"""
+    mismatches = []
+    async with AsyncSessionLocal() as db:
+        actual = await db.execute(
+            select(
+                models.Order.user_id,
+                func.count(models.Order.id),
+                func.sum(models.Order.total),
+                func.sum(models.Order.points_earned),
+            ).group_by(models.Order.user_id)
+        )
+        for user_id, count, total, points in actual:
+            stats = await get_user_stats(db, user_id)
+            recorded = (stats.order_count, float(stats.total_spent), stats.total_points_earned)
+            if recorded != (count, float(total), points):
+                mismatches.append((user_id, recorded, (count, float(total), points)))
+    return mismatches
+
+
+async def main():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seed_database(db)
+    finally:
+        db.close()
+
+    print(f"{'items':>6} {'mean ms':>9} {'p95 ms':>9} {'queries':>8}")
+    for item_count in ITEM_COUNTS:
+        order = single_item_order("user-1", item_count)
+        timings = []
+        with count_queries() as queries:
+            for _ in range(ORDERS_PER_SIZE):
+                async with AsyncSessionLocal() as db:
+                    started = time.perf_counter()
+                    await place_order("user-1", order, db)
+                    timings.append((time.perf_counter() - started) * 1000)
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(
+            f"{item_count:>6} {statistics.mean(timings):>9.2f} {p95:>9.2f} "
+            f"{queries.count / ORDERS_PER_SIZE:>8.1f}"
+        )
+
+    async with AsyncSessionLocal() as db:
+        db.add(models.User(id="batch-user", name="Пакетный"))
+        await db.commit()
+    largest = await place_batched_orders("batch-user")
+    print(f"\n{BATCHED_ORDERS} concurrent orders, largest batch {largest}")
+    try:
+        await place_orders_while_stopping("batch-user")
+    except asyncio.TimeoutError:
+        print(f"orders submitted while stopping the writer still waiting after {STOP_TIMEOUT_SECONDS}s")
+        sys.exit(1)
+    async with AsyncSessionLocal() as db:
+        stored = await db.scalar(
+            select(func.count(models.Order.id)).where(models.Order.user_id == "batch-user")
+        )
+    if stored != BATCHED_ORDERS + STOPPING_ORDERS:
+        print(f"{stored} orders stored, expected {BATCHED_ORDERS + STOPPING_ORDERS}")
+        sys.exit(1)
+    print(f"{STOPPING_ORDERS} orders submitted while stopping the writer were written")
+    mismatches = await stats_mismatches()
+    for user_id, recorded, actual in mismatches:
+        print(f"user_stats mismatch for {user_id}: recorded {recorded}, orders {actual}")
+    if mismatches:
+        sys.exit(1)
+    print("user_stats match stored orders")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
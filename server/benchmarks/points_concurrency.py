@@ -0,0 +1,117 @@
+"""
+Lost-update check for loyalty points.
+
+Fires parallel orders for one user over a real uvicorn server while
+concurrently editing the balance through ``PUT /api/users/{id}``, then
+checks that the final balance equals the opening balance plus every
+awarded point and accepted edit, and that the points ledger sums to it.
+Exits non-zero on a mismatch:
+
+    python benchmarks/points_concurrency.py [--orders 200] [--clients 16]
+"""
+import argparse
+import http.client
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+
+from throughput import ORDER, SERVER_DIR, wait_for_server
+
+
+def request(port: int, method: str, path: str, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Content-Type": "application/json"} if body else {}
+    conn.request(method, path, body=body, headers=headers)
+    response = conn.getresponse()
+    data = response.read()
+    conn.close()
+    return response.status, json.loads(data) if data else None
+
+
+def orderer(port: int, count: int, awarded: list, errors: list):
+    for _ in range(count):
+        status, order = request(port, "POST", "/api/users/user-1/orders", ORDER)
+        if status == 200:
+            awarded.append(order["points_earned"])
+        else:
+            errors.append(status)
+
+
+def editor(port: int, count: int, adjustments: list, conflicts: list):
+    for _ in range(count):
+        _, user = request(port, "GET", "/api/users/user-1")
+        # Raise the balance by one relative to what we read
+        body = json.dumps({"points": user["points"] + 1, "expected_points": user["points"]})
+        status, _ = request(port, "PUT", "/api/users/user-1", body)
+        if status == 200:
+            adjustments.append(1)
+        elif status == 409:
+            conflicts.append(1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--edits", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    db_path = f"{tempfile.mkdtemp()}/bench_points.db"
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        USER_CACHE_TTL_SECONDS="0",
+        RATE_LIMIT_ENABLED="0",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_server(args.port)
+        _, user = request(args.port, "GET", "/api/users/user-1")
+        opening = user["points"]
+
+        awarded, errors, adjustments, conflicts = [], [], [], []
+        threads = [
+            threading.Thread(
+                target=orderer, args=(args.port, args.orders // args.clients, awarded, errors)
+            )
+            for _ in range(args.clients)
+        ]
+        threads.append(threading.Thread(
+            target=editor, args=(args.port, args.edits, adjustments, conflicts)
+        ))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        _, user = request(args.port, "GET", "/api/users/user-1")
+    finally:
+        server.terminate()
+        server.wait()
+
+    with sqlite3.connect(db_path) as conn:
+        ledger = conn.execute(
+            "SELECT COALESCE(SUM(delta), 0) FROM points_ledger WHERE user_id = 'user-1'"
+        ).fetchone()[0]
+
+    expected = opening + sum(awarded) + sum(adjustments)
+    print(f"orders {len(awarded)} (errors {len(errors)})  "
+          f"edits {len(adjustments)} (conflicts {len(conflicts)})")
+    print(f"balance {user['points']}  expected {expected}  ledger {ledger}")
+    if errors or user["points"] != expected or ledger != expected:
+        print("FAIL")
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Query-count guard for the order listing endpoints.
+
+Seeds a few users with multi-item orders, then checks that listing them
+issues a fixed number of statements regardless of how many orders and
+items come back (i.e. no lazy loads during serialization). Exits non-zero
+on regression:
+
+    python benchmarks/query_counts.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_query_counts.db"
+)
+
+from pydantic import TypeAdapter  # noqa: E402
+
+import schemas  # noqa: E402
+from database import AsyncSessionLocal, Base, SessionLocal, count_queries, engine  # noqa: E402
+import queries as query_options  # noqa: E402
+from routes import admin, users  # noqa: E402
+from seed_data import seed_database  # noqa: E402
+
+ORDERS = 30
+ITEMS_PER_ORDER = 4
+
+_orders_adapter = TypeAdapter(List[schemas.OrderResponse])
+
+
+async def seed():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seed_database(db)
+    finally:
+        db.close()
+
+    async with AsyncSessionLocal() as db:
+        order = schemas.OrderCreate(
+            user_id="user-1",
+            total=0,
+            items=[
+                schemas.OrderItemCreate(
+                    drink_id=drink_id,
+                    bean_option="arabica",
+                    milk_option="regular",
+                    syrup_option="none",
+                )
+                for drink_id in ("latte", "americano", "cappuccino", "filter")[:ITEMS_PER_ORDER]
+            ],
+        )
+        for _ in range(ORDERS):
+            await users.place_order("user-1", order, db)
+
+
+async def measure(name, call, budget):
+    async with AsyncSessionLocal() as db:
+        with count_queries() as queries:
+            result = await call(db)
+            # Serialize like FastAPI would so lazy loads are counted too
+            if isinstance(result, list):
+                _orders_adapter.validate_python(result, from_attributes=True)
+    status = "ok" if queries.count <= budget else "REGRESSION"
+    print(f"{name:<32} {queries.count:>3} queries (budget {budget}) {status}")
+    return queries.count <= budget
+
+
+async def main():
+    await seed()
+    passed = True
+    print("-- column rows")
+    passed &= await measure(
+        "admin get_all_orders",
+        lambda db: admin.get_all_orders(ORDERS, None, "admin", db),
+        2,
+    )
+    passed &= await measure(
+        "users get_user_orders",
+        lambda db: users.get_user_orders("user-1", ORDERS, None, db),
+        2,
+    )
+    for strategy, extra in (("selectin", 2), ("joined", 0)):
+        query_options.ORDER_ITEMS_LOADING = strategy
+        print(f"-- {strategy}")
+        passed &= await measure(
+            "users get_user_profile",
+            lambda db: users.get_user_profile("user-1", ORDERS, None, db),
+            3 + extra,
+        )
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
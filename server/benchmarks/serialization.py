@@ -0,0 +1,110 @@
+"""
+Serialization cost of an order listing: ORM objects validated through
+List[OrderResponse] (the response_model path) vs column rows encoded with
+orjson (serializers.order_rows). Also checks both produce the same JSON.
+
+    python benchmarks/serialization.py [--orders 500] [--items 3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_serialization.db"
+)
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+import models  # noqa: E402
+import schemas  # noqa: E402
+from database import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from order_queue import PendingOrder, persist_orders  # noqa: E402
+from queries import order_loader_options  # noqa: E402
+from seed_data import seed_database  # noqa: E402
+from serializers import ORDER_COLUMNS, ORJSONResponse, order_rows  # noqa: E402
+
+ROUNDS = 20
+
+_orders_adapter = TypeAdapter(List[schemas.OrderResponse])
+
+
+async def seed(order_count: int, items_per_order: int):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seed_database(db)
+    finally:
+        db.close()
+
+    item = {
+        "drink_id": "latte", "quantity": 1, "bean_option": "Арабика",
+        "milk_option": "Овсяное", "syrup_option": "Ваниль", "price": 260,
+    }
+    async with AsyncSessionLocal() as db:
+        await persist_orders(db, [
+            PendingOrder(
+                user_id="user-1", total=260 * items_per_order, points_earned=26,
+                item_rows=[dict(item, id=models.generate_uuid()) for _ in range(items_per_order)],
+            )
+            for _ in range(order_count)
+        ])
+        await db.commit()
+
+
+async def pydantic_path(db) -> bytes:
+    stmt = select(models.Order).options(*order_loader_options()).order_by(
+        models.Order.created_at.desc(), models.Order.id.desc()
+    )
+    orders = (await db.execute(stmt)).unique().scalars().all()
+    return _orders_adapter.dump_json(
+        _orders_adapter.validate_python(orders, from_attributes=True)
+    )
+
+
+async def orjson_path(db) -> bytes:
+    stmt = select(*ORDER_COLUMNS).order_by(
+        models.Order.created_at.desc(), models.Order.id.desc()
+    )
+    orders = (await db.execute(stmt)).all()
+    return ORJSONResponse(await order_rows(db, orders)).body
+
+
+async def timed(path) -> tuple:
+    timings = []
+    for _ in range(ROUNDS):
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            body = await path(db)
+            timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), body
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--items", type=int, default=3)
+    args = parser.parse_args()
+
+    await seed(args.orders, args.items)
+    pydantic_ms, pydantic_body = await timed(pydantic_path)
+    orjson_ms, orjson_body = await timed(orjson_path)
+
+    same = json.loads(pydantic_body) == json.loads(orjson_body)
+    print(f"{args.orders} orders x {args.items} items, median of {ROUNDS} rounds")
+    print(f"response_model path  {pydantic_ms:8.2f} ms")
+    print(f"orjson column path   {orjson_ms:8.2f} ms  ({pydantic_ms / orjson_ms:.1f}x)")
+    print(f"identical JSON       {same}")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""
+Concurrent read/write throughput of each SQLite connection profile.
+
+Writer threads insert orders while reader threads page through order
+history, each profile on its own fresh database file:
+
+    python benchmarks/sqlite_profiles.py [--writers 4] [--readers 8] [--seconds 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import models  # noqa: E402
+from database import SQLITE_PROFILES, Base, apply_sqlite_profile  # noqa: E402
+from seed_data import seed_database  # noqa: E402
+
+
+def writer(Session, stop_at, counts, errors):
+    while time.monotonic() < stop_at:
+        db = Session()
+        try:
+            order_id = models.generate_uuid()
+            db.execute(insert(models.Order).values(
+                id=order_id, user_id="user-1", total=190, points_earned=19,
+                created_at=datetime.utcnow(),
+            ))
+            db.execute(insert(models.OrderItem), [{
+                "id": models.generate_uuid(), "order_id": order_id, "drink_id": "latte",
+                "quantity": 1, "bean_option": "Арабика", "milk_option": "Обычное",
+                "syrup_option": "Без сиропа", "price": 190,
+            } for _ in range(3)])
+            db.commit()
+            counts.append(1)
+        except OperationalError:
+            db.rollback()
+            errors.append(1)
+        finally:
+            db.close()
+
+
+def reader(Session, stop_at, latencies, errors):
+    stmt = (
+        select(models.Order)
+        .where(models.Order.user_id == "user-1")
+        .order_by(models.Order.created_at.desc())
+        .limit(20)
+    )
+    while time.monotonic() < stop_at:
+        db = Session()
+        try:
+            started = time.perf_counter()
+            db.execute(stmt).scalars().all()
+            latencies.append((time.perf_counter() - started) * 1000)
+        except OperationalError:
+            errors.append(1)
+        finally:
+            db.close()
+
+
+def run(profile, args):
+    url = f"sqlite:///{tempfile.mkdtemp()}/bench_{profile}.db"
+    bind = create_engine(
+        url, connect_args={"check_same_thread": False}, **SQLITE_PROFILES[profile]["pool"]
+    )
+    apply_sqlite_profile(bind, profile)
+    Base.metadata.create_all(bind=bind)
+    Session = sessionmaker(bind=bind)
+    db = Session()
+    try:
+        seed_database(db)
+    finally:
+        db.close()
+
+    writes, latencies, errors = [], [], []
+    stop_at = time.monotonic() + args.seconds
+    threads = [
+        threading.Thread(target=writer, args=(Session, stop_at, writes, errors))
+        for _ in range(args.writers)
+    ] + [
+        threading.Thread(target=reader, args=(Session, stop_at, latencies, errors))
+        for _ in range(args.readers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    bind.dispose()
+
+    p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else float("nan")
+    print(
+        f"{profile:<11} {len(writes) / args.seconds:>9.0f} {len(latencies) / args.seconds:>9.0f} "
+        f"{p99:>12.2f} {len(errors):>7}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{'profile':<11} {'writes/s':>9} {'reads/s':>9} {'read p99 ms':>12} {'errors':>7}")
+    for profile in SQLITE_PROFILES:
+        run(profile, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+End-to-end benchmark of the API's real request mix.
+
+Seeds a throwaway SQLite database with synthetic users and order history
+(seed_data.seed_synthetic), then drives a weighted mix of menu reads,
+logins, order creation, profile and history reads and admin listings,
+in-process through the ASGI app and/or over a uvicorn server. Reports
+p50/p95/p99 latency per request type and overall throughput, and compares
+the results with a stored baseline:
+
+    python benchmarks/suite.py [--mode both] [--users 1000] [--orders-per-user 20]
+                               [--clients 16] [--seconds 10]
+    python benchmarks/suite.py --save-baseline    # record benchmarks/baseline.json
+    python benchmarks/suite.py --check            # exit 1 on a p95 regression
+
+Baselines are only comparable on the same machine and scale; the scale used
+is stored with them. The in-process mode needs httpx.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_suite.db")
+# Every simulated client shares one IP
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+from throughput import wait_for_server  # noqa: E402
+
+BASELINE_PATH = os.path.join(SERVER_DIR, "benchmarks", "baseline.json")
+
+# Request type -> weight in the mix
+MIX = {
+    "menu": 30,
+    "login": 5,
+    "create_order": 15,
+    "profile": 15,
+    "user_orders": 15,
+    "points_history": 5,
+    "admin_orders": 10,
+    "admin_users": 5,
+}
+
+ORDER_ITEMS = [
+    ("latte", "Арабика", "Овсяное", "Без сиропа"),
+    ("cappuccino", "Робуста", "Обычное", "Ваниль"),
+    ("americano", "Смесь", "Миндальное", "Карамель"),
+]
+
+
+def seed(users: int, orders_per_user: int):
+    from database import Base, SessionLocal, engine
+    from migrations import run_migrations
+    from seed_data import seed_database, seed_synthetic
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        seed_database(db)
+        seed_synthetic(db, users, orders_per_user)
+    finally:
+        db.close()
+    engine.dispose()
+
+
+class RequestMix:
+    """Builds (kind, method, path, body, headers) requests in MIX proportions"""
+
+    def __init__(self, users: int, admin_token: str, seed: int):
+        from seed_data import synthetic_user_id, synthetic_user_name
+
+        self.rng = random.Random(seed)
+        self.users = users
+        self.user_id = synthetic_user_id
+        self.user_name = synthetic_user_name
+        self.admin = {"Authorization": f"Bearer {admin_token}"}
+        self.kinds = list(MIX)
+        self.weights = list(MIX.values())
+
+    def next(self):
+        rng = self.rng
+        kind = rng.choices(self.kinds, self.weights)[0]
+        index = rng.randrange(self.users)
+        user_id = self.user_id(index)
+        if kind == "menu":
+            return kind, "GET", "/api/menu", None, {}
+        if kind == "login":
+            body = {"name": self.user_name(index)}
+            return kind, "POST", "/api/users/login", body, {}
+        if kind == "create_order":
+            items = [
+                {"drink_id": drink, "quantity": 1, "bean_option": bean,
+                 "milk_option": milk, "syrup_option": syrup}
+                for drink, bean, milk, syrup in rng.sample(ORDER_ITEMS, rng.randint(1, 3))
+            ]
+            body = {"user_id": user_id, "total": 0, "items": items}
+            return kind, "POST", f"/api/users/{user_id}/orders", body, {}
+        if kind == "profile":
+            return kind, "GET", f"/api/users/{user_id}/profile?limit=20", None, {}
+        if kind == "user_orders":
+            return kind, "GET", f"/api/users/{user_id}/orders?limit=20", None, {}
+        if kind == "points_history":
+            return kind, "GET", f"/api/users/{user_id}/points/history?limit=20", None, {}
+        if kind == "admin_orders":
+            return kind, "GET", "/api/admin/orders?limit=50", None, self.admin
+        return kind, "GET", "/api/admin/users?limit=50", None, self.admin
+
+
+def admin_token() -> str:
+    from routes.admin import create_access_token
+
+    return create_access_token({"sub": "admin"})
+
+
+async def run_in_process(args, latencies, errors) -> float:
+    import httpx
+    import main
+
+    mix = RequestMix(args.users, admin_token(), args.seed)
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            stop_at = time.monotonic() + args.seconds
+
+            async def worker():
+                while time.monotonic() < stop_at:
+                    kind, method, path, body, headers = mix.next()
+                    started = time.perf_counter()
+                    response = await client.request(method, path, json=body, headers=headers)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    if response.status_code >= 400:
+                        errors[kind] += 1
+                    else:
+                        latencies[kind].append(elapsed)
+
+            started = time.monotonic()
+            await asyncio.gather(*(worker() for _ in range(args.clients)))
+            return time.monotonic() - started
+
+
+def run_over_uvicorn(args, latencies, errors) -> float:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--log-level", "warning"],
+        cwd=SERVER_DIR, env=dict(os.environ), stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_server(args.port)
+        token = admin_token()
+        lock = threading.Lock()
+        stop_at = time.monotonic() + args.seconds
+
+        def worker(seed: int):
+            mix = RequestMix(args.users, token, seed)
+            conn = http.client.HTTPConnection("127.0.0.1", args.port, timeout=30)
+            while time.monotonic() < stop_at:
+                kind, method, path, body, headers = mix.next()
+                if body is not None:
+                    headers = dict(headers, **{"Content-Type": "application/json"})
+                    body = json.dumps(body)
+                started = time.perf_counter()
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    failed = response.status >= 400
+                except (OSError, http.client.HTTPException):
+                    conn = http.client.HTTPConnection("127.0.0.1", args.port, timeout=30)
+                    failed = True
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    if failed:
+                        errors[kind] += 1
+                    else:
+                        latencies[kind].append(elapsed)
+
+        threads = [
+            threading.Thread(target=worker, args=(args.seed + i,)) for i in range(args.clients)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.monotonic() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(latencies, errors, elapsed: float) -> dict:
+    results = {}
+    for kind in MIX:
+        samples = latencies.get(kind, [])
+        if len(samples) < 2:
+            continue
+        quantiles = statistics.quantiles(samples, n=100)
+        results[kind] = {
+            "count": len(samples),
+            "errors": errors.get(kind, 0),
+            "p50": round(quantiles[49], 2),
+            "p95": round(quantiles[94], 2),
+            "p99": round(quantiles[98], 2),
+        }
+    total = sum(len(samples) for samples in latencies.values())
+    results["total"] = {
+        "count": total,
+        "errors": sum(errors.values()),
+        "rps": round(total / elapsed, 1),
+    }
+    return results
+
+
+def report(mode: str, results: dict, baseline: dict, tolerance: float) -> list:
+    """Print results next to the baseline; returns the regressed request types"""
+    regressions = []
+    print(f"\n== {mode}")
+    print(f"{'request':<16} {'count':>7} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  vs baseline p95")
+    for kind, row in results.items():
+        if kind == "total":
+            continue
+        line = (f"{kind:<16} {row['count']:>7} {row['errors']:>6} "
+                f"{row['p50']:>8.1f} {row['p95']:>8.1f} {row['p99']:>8.1f}")
+        before = baseline.get(kind)
+        if before:
+            change = (row["p95"] - before["p95"]) / before["p95"]
+            line += f"  {change:+.0%}"
+            if change > tolerance:
+                line += "  REGRESSION"
+                regressions.append(f"{mode}.{kind}")
+        print(line)
+    total = results["total"]
+    line = f"throughput {total['rps']} req/s, {total['errors']} errors"
+    if "total" in baseline:
+        line += f" (baseline {baseline['total']['rps']} req/s)"
+    print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["in-process", "uvicorn", "both"], default="both")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--orders-per-user", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 on a p95 regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 increase")
+    args = parser.parse_args()
+
+    scale = {"users": args.users, "orders_per_user": args.orders_per_user, "clients": args.clients}
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored["meta"]["scale"] == scale:
+            baseline = stored["results"]
+        else:
+            print(f"Baseline scale {stored['meta']['scale']} differs, not comparing")
+
+    seed(args.users, args.orders_per_user)
+
+    modes = ["in-process", "uvicorn"] if args.mode == "both" else [args.mode]
+    all_results, regressions = {}, []
+    for mode in modes:
+        latencies, errors = defaultdict(list), defaultdict(int)
+        if mode == "in-process":
+            elapsed = asyncio.run(run_in_process(args, latencies, errors))
+        else:
+            elapsed = run_over_uvicorn(args, latencies, errors)
+        all_results[mode] = summarize(latencies, errors, elapsed)
+        regressions += report(mode, all_results[mode], baseline.get(mode, {}), args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "meta": {
+                    "scale": scale,
+                    "seconds": args.seconds,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                },
+                "results": all_results,
+            }, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nBaseline saved to {args.baseline}")
+    if args.check and regressions:
+        print(f"\np95 regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Throughput of the API under concurrent load over a real uvicorn server.
+
+Starts uvicorn on a throwaway SQLite database and drives a mix of reads
+and order creation from client threads:
+
+    python benchmarks/throughput.py [--clients 32] [--seconds 10]
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ORDER = json.dumps({
+    "user_id": "user-1",
+    "total": 0,
+    "items": [{
+        "drink_id": "latte",
+        "quantity": 1,
+        "bean_option": "arabica",
+        "milk_option": "oat",
+        "syrup_option": "none",
+        "price": 190,
+    }],
+})
+
+# (method, path, body) weighted by repetition
+MIX = [
+    ("GET", "/api/users/user-1", None),
+    ("GET", "/api/users/user-1", None),
+    ("GET", "/api/users/user-1/profile?limit=10", None),
+    ("GET", "/api/users/user-1/orders?limit=10", None),
+    ("POST", "/api/users/user-1/orders", ORDER),
+]
+
+
+def wait_for_server(port: int, timeout: float = 20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def client(port: int, stop_at: float, latencies: list, errors: list):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    i = 0
+    while time.monotonic() < stop_at:
+        method, path, body = MIX[i % len(MIX)]
+        i += 1
+        headers = {"Content-Type": "application/json"} if body else {}
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as exc:
+            errors.append(type(exc).__name__)
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_throughput.db")
+    # Every client shares one IP and user
+    env.setdefault("RATE_LIMIT_ENABLED", "0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_server(args.port)
+        latencies, errors = [], []
+        stop_at = time.monotonic() + args.seconds
+        threads = [
+            threading.Thread(target=client, args=(args.port, stop_at, latencies, errors))
+            for _ in range(args.clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"clients={args.clients} seconds={args.seconds:g}")
+    print(f"requests  {len(latencies)}  ({len(latencies) / args.seconds:.0f} req/s)")
+    print(f"errors    {len(errors)}")
+    print(f"p50 {quantiles[49]:.1f} ms  p95 {quantiles[94]:.1f} ms  p99 {quantiles[98]:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
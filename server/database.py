@@ -1,22 +1,271 @@
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 SQLALCHEMY_DATABASE_URL = os.getenv(
     "DATABASE_URL", "sqlite:///./data/coffee_shop.db"
 )
 
+# Async drivers used by the request path for each sync dialect
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+# Drivers for the sync engine when DATABASE_URL names none. SQLAlchemy's own
+# default for a bare postgresql:// changes between releases (psycopg2 in 2.0,
+# psycopg 3 in 2.1), so pin the one requirements.txt installs.
+SYNC_DRIVERS = {
+    "postgresql": "psycopg2",
+}
+
+
+def sync_database_url(url: str) -> str:
+    """Name the sync driver in DATABASE_URL when it only gives the backend"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if parsed.drivername != backend or backend not in SYNC_DRIVERS:
+        return url
+    return parsed.set(drivername=f"{backend}+{SYNC_DRIVERS[backend]}").render_as_string(
+        hide_password=False
+    )
+
+
+def async_database_url(url: str) -> str:
+    """Derive the async driver URL (aiosqlite, asyncpg) from DATABASE_URL"""
+    parsed = make_url(url)
+    if parsed.get_dialect().is_async:
+        return url
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(
+        hide_password=False
+    )
+
+
+def dialect_insert(dialect_name: str, table):
+    """INSERT construct with ``on_conflict_do_update`` for Postgres or SQLite"""
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    return insert(table)
+
+
+# SQLite connection profiles, selected with SQLITE_PROFILE. "default" keeps
+# SQLite's rollback journal, where a writer blocks every reader; "production"
+# switches to WAL so reads proceed during a commit, and relaxes fsync to
+# checkpoints (safe against application crashes, not power loss).
+SQLITE_PROFILES = {
+    "default": {
+        "pragmas": {},
+        "pool": {},
+    },
+    "production": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "cache_size": -64000,  # KiB, i.e. 64 MB per connection
+            "mmap_size": 268435456,
+            "temp_store": "MEMORY",
+        },
+        "pool": {"pool_size": 10, "max_overflow": 10, "pool_timeout": 30},
+    },
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default")
+
+
+def apply_sqlite_profile(bind, profile: str = SQLITE_PROFILE):
+    """Run the profile's PRAGMAs on every new connection of a sync engine"""
+    pragmas = SQLITE_PROFILES[profile]["pragmas"]
+    if bind.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(bind, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+# Pool settings for server databases (Postgres). Connections are checked
+# before use and recycled so restarts and idle timeouts on the server side
+# or a proxy (pgbouncer, cloud load balancers) do not surface as errors.
+# pool_size and max_overflow are upper bounds for the async engine, which
+# gets its share of DB_MAX_CONNECTIONS (see _server_pool).
+SERVER_POOL = {
+    "pool_size": 10,
+    "max_overflow": 20,
+    "pool_timeout": 30,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+}
+
+# The sync engine only runs startup, seeding, CLI tools and menu rebuilds on
+# a cache miss, so on a server database it holds a connection or two
+SYNC_POOL = dict(SERVER_POOL, pool_size=1, max_overflow=1)
+
+# Connections the app may open on the server across all workers (keep it
+# below the server's max_connections), and the worker count sharing them,
+# the same variable uvicorn reads for --workers
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "90"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Environment overrides for the request path: variable -> (pool option, parser)
+POOL_SETTINGS = {
+    "DB_POOL_SIZE": ("pool_size", int),
+    "DB_MAX_OVERFLOW": ("max_overflow", int),
+    "DB_POOL_TIMEOUT": ("pool_timeout", float),
+    "DB_POOL_PRE_PING": ("pool_pre_ping", lambda value: value == "1"),
+    "DB_POOL_RECYCLE": ("pool_recycle", int),
+}
+
+
+def _server_pool() -> dict:
+    """Async pool for a server database: this worker's share of DB_MAX_CONNECTIONS
+
+    Each worker keeps SYNC_POOL's connections aside and fills SERVER_POOL's
+    pool_size, then max_overflow, from the rest of its share.
+    """
+    share = DB_MAX_CONNECTIONS // max(WEB_CONCURRENCY, 1)
+    available = max(share - SYNC_POOL["pool_size"] - SYNC_POOL["max_overflow"], 1)
+    pool_size = min(SERVER_POOL["pool_size"], available)
+    max_overflow = min(SERVER_POOL["max_overflow"], available - pool_size)
+    return dict(SERVER_POOL, pool_size=pool_size, max_overflow=max_overflow)
+
+
+def _engine_options(url: str, sync: bool = False) -> dict:
+    """Pool options for ``url``: the SQLite profile's, or SYNC_POOL / the
+    worker's share for a server database, then env overrides"""
+    if make_url(url).get_backend_name() == "sqlite":
+        if ":memory:" in url:
+            # Single-connection pools take no sizing options
+            return {}
+        options = dict(SQLITE_PROFILES[SQLITE_PROFILE]["pool"])
+    elif sync:
+        return dict(SYNC_POOL)
+    else:
+        options = _server_pool()
+    for variable, (option, parse) in POOL_SETTINGS.items():
+        value = os.getenv(variable)
+        if value:
+            options[option] = parse(value)
+    return options
+
+
+def _connect_args(url: str) -> dict:
+    if make_url(url).get_backend_name() == "sqlite":
+        # Sessions are used from FastAPI's threadpool
+        return {"check_same_thread": False}
+    return {}
+
+
+# Sync engine: schema creation, seeding and command-line tools
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    sync_database_url(SQLALCHEMY_DATABASE_URL),
+    connect_args=_connect_args(SQLALCHEMY_DATABASE_URL),
+    **_engine_options(SQLALCHEMY_DATABASE_URL, sync=True)
 )
+apply_sqlite_profile(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: request handlers
+async_engine = create_async_engine(
+    os.getenv("ASYNC_DATABASE_URL") or async_database_url(SQLALCHEMY_DATABASE_URL),
+    **_engine_options(SQLALCHEMY_DATABASE_URL)
+)
+apply_sqlite_profile(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+class QueryStats:
+    """Statement count and total execution time"""
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# Every statement on either engine, and those of the current request when
+# metrics.MetricsMiddleware has set request_query_stats
+query_totals = QueryStats()
+request_query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "request_query_stats", default=None
+)
+_query_totals_lock = threading.Lock()
+
+
+def track_query_time(bind):
+    @event.listens_for(bind, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(bind, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("query_started", time.perf_counter())
+        with _query_totals_lock:
+            query_totals.count += 1
+            query_totals.seconds += elapsed
+        stats = request_query_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+
+
+track_query_time(engine)
+track_query_time(async_engine.sync_engine)
+
+
+def pool_status() -> dict:
+    """Connection pool usage per engine (pools without a size are skipped)"""
+    status = {}
+    for name, bind in (("async", async_engine.sync_engine), ("sync", engine)):
+        pool = bind.pool
+        if hasattr(pool, "checkedout") and hasattr(pool, "size"):
+            status[name] = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                # Overflow starts at -size until the pool has filled up
+                "overflow": max(0, pool.overflow()),
+            }
+    return status
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
+
+
+class QueryCounter:
+    count = 0
+
+
+@contextmanager
+def count_queries(bind=None):
+    """Count statements executed on ``bind`` (default: the async engine) inside the block"""
+    if bind is None:
+        bind = async_engine.sync_engine
+    counter = QueryCounter()
+
+    def _before_cursor_execute(*args):
+        counter.count += 1
+
+    event.listen(bind, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield counter
     finally:
-        db.close()
+        event.remove(bind, "before_cursor_execute", _before_cursor_execute)
@@ -0,0 +1,95 @@
+"""
+In-process pub/sub feeding the admin live order stream.
+
+``create_order`` publishes each order after it is committed. Subscribers get
+their own bounded queue; the last ``ORDER_FEED_HISTORY`` events are kept so
+a reconnecting client can resume from its ``Last-Event-ID``. Event ids are
+``<boot>-<seq>``: an id from a previous process replays the whole history.
+A subscriber that falls too far behind is dropped and resumes on reconnect.
+"""
+import asyncio
+import os
+import uuid
+from collections import deque
+from typing import AsyncIterator, List, Optional, Set, Tuple
+
+ORDER_FEED_HISTORY = int(os.getenv("ORDER_FEED_HISTORY", "1000"))
+ORDER_FEED_QUEUE_SIZE = int(os.getenv("ORDER_FEED_QUEUE_SIZE", "256"))
+HEARTBEAT_SECONDS = 15
+
+Event = Tuple[str, int, bytes]
+
+
+class Subscription:
+    def __init__(self, queue_size: int):
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+
+class EventFeed:
+    def __init__(self, name: str, history: int = ORDER_FEED_HISTORY, queue_size: int = ORDER_FEED_QUEUE_SIZE):
+        self.name = name
+        self.queue_size = queue_size
+        self._boot = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._history: "deque[Event]" = deque(maxlen=history)
+        self._subscribers: Set[Subscription] = set()
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def publish(self, data: bytes):
+        """Append an event and fan it out; must be called on the event loop"""
+        self._seq += 1
+        event = (f"{self._boot}-{self._seq}", self._seq, data)
+        self._history.append(event)
+        self.published += 1
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+                self._subscribers.discard(subscription)
+                self.dropped_subscribers += 1
+
+    def _replay(self, last_event_id: Optional[str]) -> List[Event]:
+        if last_event_id is None:
+            return []
+        boot, _, seq = last_event_id.partition("-")
+        if boot != self._boot or not seq.isdigit():
+            return list(self._history)
+        return [event for event in self._history if event[1] > int(seq)]
+
+    async def stream(self, last_event_id: Optional[str], is_disconnected) -> AsyncIterator[bytes]:
+        """Yield Server-Sent Events frames until the client goes away"""
+        subscription = Subscription(self.queue_size)
+        backlog = self._replay(last_event_id)
+        self._subscribers.add(subscription)
+        try:
+            yield b"retry: 3000\n\n"
+            for event in backlog:
+                yield self._frame(event)
+            while not subscription.overflowed:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        break
+                    yield b": keepalive\n\n"
+                    continue
+                yield self._frame(event)
+        finally:
+            self._subscribers.discard(subscription)
+
+    def _frame(self, event: Event) -> bytes:
+        event_id, _, data = event
+        return b"id: %s\nevent: %s\ndata: %s\n\n" % (event_id.encode(), self.name.encode(), data)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+order_feed = EventFeed("order")
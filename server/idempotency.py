@@ -0,0 +1,98 @@
+"""
+Idempotency keys for order creation.
+
+A client sends the same ``Idempotency-Key`` header on every retry of one
+order. The first request runs; concurrent duplicates wait for it, and later
+ones get its stored response for ``IDEMPOTENCY_TTL_SECONDS`` without touching
+the database. Keys are scoped per user and bounded by ``IDEMPOTENCY_CACHE_SIZE``.
+Reusing a key with a different request body is rejected with 422. Failed
+requests are not stored, so a retry after an error runs again.
+
+The store is per process: with several workers, retries are deduplicated only
+when they reach the same worker.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from fastapi import HTTPException
+
+from auth_cache import TTLCache
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+class IdempotencyStore:
+    def __init__(self, maxsize: int = IDEMPOTENCY_CACHE_SIZE, ttl: float = IDEMPOTENCY_TTL_SECONDS):
+        self.ttl = ttl
+        self._done = TTLCache(maxsize)
+        self._in_flight: Dict[Hashable, Tuple[str, asyncio.Future]] = {}
+        self.replayed = 0
+        self.joined = 0
+        self.conflicts = 0
+
+    def _check(self, stored: str, fingerprint: str):
+        if stored != fingerprint:
+            self.conflicts += 1
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request"
+            )
+
+    async def run(
+        self, key: Hashable, body: bytes, create: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """Return (response, replayed), calling ``create`` at most once per key"""
+        fingerprint = hashlib.sha256(body).hexdigest()
+        while True:
+            stored = self._done.get(key)
+            if stored is not None:
+                self._check(stored[0], fingerprint)
+                self.replayed += 1
+                return stored[1], True
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                break
+            self._check(in_flight[0], fingerprint)
+            self.joined += 1
+            try:
+                return await asyncio.shield(in_flight[1]), True
+            except asyncio.CancelledError:
+                if not in_flight[1].cancelled():
+                    raise
+                # The first request was cancelled before finishing: take over
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (fingerprint, future)
+        try:
+            result = await create()
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # nobody may be waiting; mark it retrieved
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            self._done.set(key, (fingerprint, result), time.time() + self.ttl)
+            future.set_result(result)
+            return result, False
+        finally:
+            self._in_flight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            **self._done.stats(),
+            "in_flight": len(self._in_flight),
+            "replayed": self.replayed,
+            "joined": self.joined,
+            "conflicts": self.conflicts,
+        }
+
+
+order_idempotency = IdempotencyStore()
@@ -0,0 +1,120 @@
+"""
+Per-user loyalty aggregates.
+
+``user_stats`` keeps a running total of each user's orders so profile loads
+do not have to scan their whole history. ``record_orders`` updates it in the
+same transaction as the orders; ``reconcile_user_stats`` rebuilds it from
+``orders`` and is exposed as a command for backfills:
+
+    python loyalty.py reconcile
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+
+
+def _aggregate_orders():
+    return select(
+        models.Order.user_id,
+        func.coalesce(func.sum(models.Order.total), 0),
+        func.coalesce(func.sum(models.Order.points_earned), 0),
+        func.count(models.Order.id),
+        func.max(models.Order.created_at),
+    ).group_by(models.Order.user_id)
+
+
+async def record_orders(
+    db: AsyncSession,
+    user_id: str,
+    total: float,
+    points_earned: int,
+    order_count: int,
+    last_order_at: datetime,
+):
+    """
+    Add a user's flushed orders to their running aggregates. Call once per
+    user per transaction, with the orders' summed totals.
+    """
+    stats = models.UserStats.__table__
+    increments = {
+        "total_spent": stats.c.total_spent + total,
+        "total_points_earned": stats.c.total_points_earned + points_earned,
+        "order_count": stats.c.order_count + order_count,
+        "last_order_at": case(
+            (stats.c.last_order_at > last_order_at, stats.c.last_order_at),
+            else_=last_order_at,
+        ),
+    }
+    result = await db.execute(
+        update(stats).where(stats.c.user_id == user_id).values(increments)
+    )
+    if result.rowcount == 0:
+        # First order since aggregates were introduced: seed the row from the
+        # user's full history, which already includes the flushed orders. A
+        # concurrent transaction may seed it first (its history lacks these
+        # uncommitted orders), so on conflict add them as above.
+        stmt = dialect_insert(db.bind.dialect.name, stats).from_select(
+            ["user_id", "total_spent", "total_points_earned", "order_count", "last_order_at"],
+            _aggregate_orders().where(models.Order.user_id == user_id),
+        )
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[stats.c.user_id], set_=increments
+        ))
+
+
+async def get_user_stats(db: AsyncSession, user_id: str) -> models.UserStats:
+    """Return the user's aggregates, computing them if not materialized yet"""
+    stats = await db.get(models.UserStats, user_id)
+    if stats is not None:
+        return stats
+    result = await db.execute(
+        _aggregate_orders().where(models.Order.user_id == user_id)
+    )
+    row = result.first()
+    if row is None:
+        return models.UserStats(
+            user_id=user_id, total_spent=0, total_points_earned=0, order_count=0
+        )
+    _, total_spent, total_points_earned, order_count, last_order_at = row
+    return models.UserStats(
+        user_id=user_id,
+        total_spent=total_spent,
+        total_points_earned=total_points_earned,
+        order_count=order_count,
+        last_order_at=last_order_at,
+    )
+
+
+def reconcile_user_stats(db: Session) -> int:
+    """Rebuild every user's aggregates from the orders table"""
+    db.execute(delete(models.UserStats))
+    result = db.execute(
+        insert(models.UserStats).from_select(
+            ["user_id", "total_spent", "total_points_earned", "order_count", "last_order_at"],
+            _aggregate_orders(),
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    from database import Base, SessionLocal, engine
+
+    if sys.argv[1:] != ["reconcile"]:
+        print("usage: python loyalty.py reconcile")
+        sys.exit(2)
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        count = reconcile_user_stats(db)
+        print(f"Reconciled stats for {count} users")
+    finally:
+        db.close()
@@ -1,20 +1,38 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base, SessionLocal
-from routes import drinks, users, admin
-from seed_data import seed_database
+from fastapi.responses import JSONResponse
+from routes import drinks, menu, users, admin
+import startup
+from order_queue import ORDER_BATCHING, order_batcher
+from metrics import MetricsMiddleware, metrics
+from rate_limit import LoadShedder
 
 app = FastAPI(title="Coffee Shop API", version="1.0.0")
 
-# Create tables and seed database on startup
+# Bring the schema up to date (skipped when already current), then warm up
 @app.on_event("startup")
-def startup_event():
-    Base.metadata.create_all(bind=engine)
-    db = SessionLocal()
-    try:
-        seed_database(db)
-    finally:
-        db.close()
+async def startup_event():
+    await startup.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await startup.stop()
+
+
+@app.on_event("startup")
+async def start_order_batcher():
+    if ORDER_BATCHING:
+        order_batcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_order_batcher():
+    await order_batcher.stop()
+
+# Reject requests beyond the concurrency cap before they queue for the
+# database (added first so CORS headers are still set on its 503s)
+app.add_middleware(LoadShedder)
 
 # CORS middleware - allow client to connect
 app.add_middleware(
@@ -28,10 +46,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed"],
 )
 
+# Outermost, so shed and CORS-rejected requests are measured too
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(drinks.router)
+app.include_router(menu.router)
 app.include_router(users.router)
 app.include_router(admin.router)
 
@@ -42,5 +65,21 @@ def root():
 
 
 @app.get("/health")
+@app.get("/health/live")
 def health():
+    """Liveness: the process is serving requests"""
     return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def health_ready():
+    """Readiness: schema checked and caches and connections warm"""
+    return JSONResponse(
+        startup.readiness.stats(), status_code=200 if startup.readiness.ready else 503
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus text exposition of request, database and pool metrics"""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,247 @@
+"""
+In-process cache of the public menu catalog.
+
+Drinks and customization options only change when an admin edits the menu,
+so the public read endpoints serve pre-serialized JSON from a snapshot kept
+here instead of querying the database on every request. Admin mutations call
+``menu_cache.invalidate()`` after their commit and the next read rebuilds it.
+
+With several worker processes each has its own snapshot. Admin mutations
+therefore also ``bump_menu_version`` in the ``cache_versions`` table, in the
+same transaction as the change; every snapshot records the shared version it
+was built from, and ``menu_watcher`` polls that one row every
+``MENU_VERSION_POLL_SECONDS`` and drops a snapshot that is behind. A menu
+edit reaches every worker within that interval.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+import schemas
+from database import AsyncSessionLocal, SessionLocal, dialect_insert
+
+MENU_VERSION_POLL_SECONDS = float(os.getenv("MENU_VERSION_POLL_SECONDS", "1"))
+# Row of cache_versions for the menu
+MENU_VERSION_KEY = "menu"
+
+_drinks_adapter = TypeAdapter(List[schemas.DrinkResponse])
+_drink_adapter = TypeAdapter(schemas.DrinkResponse)
+_options_adapter = TypeAdapter(List[schemas.OptionResponse])
+_menu_adapter = TypeAdapter(schemas.MenuResponse)
+
+
+@dataclass(frozen=True)
+class CachedPayload:
+    body: bytes
+    etag: str
+
+    @classmethod
+    def from_bytes(cls, body: bytes) -> "CachedPayload":
+        return cls(body=body, etag=f'"{hashlib.sha1(body).hexdigest()}"')
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    # cache_versions value read before the catalog, for cross-worker invalidation
+    shared_version: int
+    # Parsed catalog used to validate and price orders without a query
+    active_drinks: Dict[str, schemas.DrinkResponse]
+    bean_options: Dict[str, schemas.OptionResponse]
+    milk_options: Dict[str, schemas.OptionResponse]
+    syrup_options: Dict[str, schemas.OptionResponse]
+    drinks: CachedPayload
+    drink_by_id: Dict[str, CachedPayload]
+    beans: CachedPayload
+    milk: CachedPayload
+    syrups: CachedPayload
+    menu: CachedPayload
+
+
+class MenuCache:
+    """Versioned, lazily rebuilt snapshot of the active menu"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._build(self._version)
+            return self._snapshot
+
+    async def aget(self) -> CatalogSnapshot:
+        """Like ``get`` but rebuilds off the event loop on a miss"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        return await run_in_threadpool(self.get)
+
+    def invalidate(self):
+        """Drop the current snapshot; call after committing a menu change"""
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
+
+    def sync(self, shared_version: int) -> bool:
+        """Drop the snapshot if it predates ``shared_version``; returns whether it did"""
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.shared_version == shared_version:
+            return False
+        with self._lock:
+            if self._snapshot is snapshot:
+                self._version += 1
+                self._snapshot = None
+        return True
+
+    def _build(self, version: int) -> CatalogSnapshot:
+        db = SessionLocal()
+        try:
+            shared = db.get(models.CacheVersion, MENU_VERSION_KEY)
+            drinks = _drinks_adapter.validate_python(
+                db.query(models.Drink).filter(models.Drink.is_active == 1).all(),
+                from_attributes=True,
+            )
+            beans = _options_adapter.validate_python(
+                db.query(models.BeanOption).all(), from_attributes=True
+            )
+            milk = _options_adapter.validate_python(
+                db.query(models.MilkOption).all(), from_attributes=True
+            )
+            syrups = _options_adapter.validate_python(
+                db.query(models.SyrupOption).all(), from_attributes=True
+            )
+
+            parts = {
+                "drinks": CachedPayload.from_bytes(_drinks_adapter.dump_json(drinks)),
+                "beans": CachedPayload.from_bytes(_options_adapter.dump_json(beans)),
+                "milk": CachedPayload.from_bytes(_options_adapter.dump_json(milk)),
+                "syrups": CachedPayload.from_bytes(_options_adapter.dump_json(syrups)),
+            }
+            # The combined menu is versioned by a hash of its parts so clients
+            # can tell whether anything changed without diffing the payload
+            content_hash = hashlib.sha1(
+                b"".join(part.body for part in parts.values())
+            ).hexdigest()
+            menu = schemas.MenuResponse(
+                version=content_hash, drinks=drinks, beans=beans, milk=milk, syrups=syrups
+            )
+
+            return CatalogSnapshot(
+                version=version,
+                shared_version=shared.version if shared else 0,
+                active_drinks={drink.id: drink for drink in drinks},
+                bean_options=_index_options(beans),
+                milk_options=_index_options(milk),
+                syrup_options=_index_options(syrups),
+                drink_by_id={
+                    drink.id: CachedPayload.from_bytes(_drink_adapter.dump_json(drink))
+                    for drink in drinks
+                },
+                menu=CachedPayload(
+                    body=_menu_adapter.dump_json(menu), etag=f'"{content_hash}"'
+                ),
+                **parts,
+            )
+        finally:
+            db.close()
+
+
+def _index_options(options: List[schemas.OptionResponse]) -> Dict[str, schemas.OptionResponse]:
+    """Index options by display name as well as id; the client submits names"""
+    lookup = {option.name: option for option in options}
+    lookup.update({option.id: option for option in options})
+    return lookup
+
+
+def cached_response(request: Request, payload: CachedPayload) -> Response:
+    """Serve a cached payload, answering conditional requests with 304"""
+    headers = {"ETag": payload.etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == payload.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
+
+menu_cache = MenuCache()
+
+
+async def bump_menu_version(db: AsyncSession):
+    """Tell other workers the menu changed; call before committing the change"""
+    table = models.CacheVersion.__table__
+    # One upsert, so concurrent first bumps do not both try to insert the row
+    stmt = dialect_insert(db.bind.dialect.name, table).values(name=MENU_VERSION_KEY, version=1)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.name], set_={"version": table.c.version + 1}
+    ))
+
+
+class MenuVersionWatcher:
+    """Background task invalidating ``menu_cache`` when another worker bumps the version"""
+
+    def __init__(self, cache: MenuCache, interval: float = MENU_VERSION_POLL_SECONDS):
+        self.cache = cache
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.polls = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        table = models.CacheVersion
+        stmt = select(table.version).where(table.name == MENU_VERSION_KEY)
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    version = (await db.execute(stmt)).scalar()
+            except Exception:
+                self.errors += 1
+                continue
+            self.polls += 1
+            if self.cache.sync(version or 0):
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            "version": self.cache.version,
+            "poll_seconds": self.interval,
+            "polls": self.polls,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+menu_watcher = MenuVersionWatcher(menu_cache)
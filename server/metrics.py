@@ -0,0 +1,164 @@
+"""
+Prometheus metrics for ``GET /metrics``.
+
+``MetricsMiddleware`` times every HTTP request and records, per route
+template (``/api/users/{user_id}/orders``, not the raw path), the request
+count by status, a latency histogram, and histograms of the number and
+duration of database statements the request ran. Statement timing comes from
+the cursor events registered in database.py. Everything is kept in plain
+in-process counters and rendered in the Prometheus text format on scrape;
+with several workers each one reports its own.
+"""
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from database import QueryStats, pool_status, query_totals, request_query_stats
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Iterable[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (last is +Inf)..., sum]
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = bound if isinstance(bound, str) else format(bound, "g")
+                lines.append(f"{self.name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _sample(name: str, kind: str, help: str, samples: Iterable[Tuple[Labels, float]]) -> List[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in samples)
+    return lines
+
+
+class Metrics:
+    def __init__(self):
+        self.requests: Dict[Labels, int] = defaultdict(int)
+        self.in_flight = 0
+        self.latency = Histogram(
+            "http_request_duration_seconds", "Request latency by route", LATENCY_BUCKETS
+        )
+        self.db_queries = Histogram(
+            "http_request_db_queries", "Database statements per request by route", QUERY_COUNT_BUCKETS
+        )
+        self.db_seconds = Histogram(
+            "http_request_db_seconds", "Database time per request by route", LATENCY_BUCKETS
+        )
+
+    def record(self, method: str, route: str, status: int, elapsed: float, queries: QueryStats):
+        self.requests[(("method", method), ("route", route), ("status", str(status)))] += 1
+        labels = (("method", method), ("route", route))
+        self.latency.observe(labels, elapsed)
+        self.db_queries.observe(labels, queries.count)
+        self.db_seconds.observe(labels, queries.seconds)
+
+    def render(self) -> str:
+        lines = _sample(
+            "http_requests_total", "counter", "Requests by route and status",
+            sorted(self.requests.items()),
+        )
+        lines += _sample(
+            "http_requests_in_flight", "gauge", "Requests being processed", [((), self.in_flight)]
+        )
+        lines += self.latency.render()
+        lines += self.db_queries.render()
+        lines += self.db_seconds.render()
+        lines += _sample(
+            "db_queries_total", "counter", "Database statements executed",
+            [((), query_totals.count)],
+        )
+        lines += _sample(
+            "db_query_seconds_total", "counter", "Time spent executing database statements",
+            [((), query_totals.seconds)],
+        )
+        pools = pool_status()
+        for field, help in (
+            ("size", "Configured pool size"),
+            ("checked_out", "Connections in use"),
+            ("checked_in", "Idle connections in the pool"),
+            ("overflow", "Connections open beyond the pool size"),
+        ):
+            lines += _sample(
+                f"db_pool_{field}", "gauge", help,
+                [((("engine", engine),), pool[field]) for engine, pool in pools.items()],
+            )
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """ASGI middleware feeding ``metrics``; place it outermost"""
+
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        queries = QueryStats()
+        token = request_query_stats.set(queries)
+        registry = self.registry
+        registry.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            registry.in_flight -= 1
+            request_query_stats.reset(token)
+            route = scope.get("route")
+            registry.record(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status,
+                elapsed,
+                queries,
+            )
@@ -0,0 +1,192 @@
+"""
+Versioned schema migrations.
+
+``Base.metadata.create_all`` only creates missing tables, so changes to
+existing tables (new indexes, new columns) are applied here. Each migration
+runs once, in its own transaction, and is recorded in ``schema_migrations``.
+Migrations must be safe on a database freshly created by ``create_all``,
+which already has the latest schema. New tables need a migration too:
+startup skips ``create_all`` once ``SCHEMA_VERSION`` is recorded.
+
+    python migrations.py           # apply pending migrations
+    python migrations.py status    # list applied and pending migrations
+"""
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, func, inspect, literal, select, text
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+
+import models
+from points import OPENING
+from rollups import rebuild_rollups
+
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def create_indexes(*names):
+    """Migration step creating model indexes, by name, on existing tables"""
+    def upgrade(conn: Connection):
+        indexes = {
+            index.name: index
+            for table in models.Base.metadata.tables.values()
+            for index in table.indexes
+        }
+        for name in names:
+            indexes[name].create(conn, checkfirst=True)
+    return upgrade
+
+
+def add_columns(table_name: str, *names):
+    """Migration step adding model columns to an existing table"""
+    def upgrade(conn: Connection):
+        table = models.Base.metadata.tables[table_name]
+        existing = {column["name"] for column in inspect(conn).get_columns(table_name)}
+        for name in names:
+            if name not in existing:
+                column = CreateColumn(table.c[name]).compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column}"))
+    return upgrade
+
+
+def create_tables(*names):
+    """Migration step creating new model tables"""
+    def upgrade(conn: Connection):
+        for name in names:
+            models.Base.metadata.tables[name].create(conn, checkfirst=True)
+    return upgrade
+
+
+def alter_column_types(*columns):
+    """Migration step converting existing "table.column"s to their model type
+
+    SQLite is skipped: it cannot change a column's type, and its variants of
+    the changed types (Money is REAL there) match what it already stores.
+    """
+    def upgrade(conn: Connection):
+        if conn.dialect.name == "sqlite":
+            return
+        for name in columns:
+            table_name, column_name = name.split(".")
+            column = models.Base.metadata.tables[table_name].c[column_name]
+            type_ = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(
+                f"ALTER TABLE {table_name} ALTER COLUMN {column_name} "
+                f"TYPE {type_} USING {column_name}::{type_}"
+            ))
+    return upgrade
+
+
+def open_points_ledger(conn: Connection):
+    """Record each existing balance as the user's opening ledger entry"""
+    ledger = models.PointsLedger.__table__
+    users = models.User.__table__
+    conn.execute(ledger.insert().from_select(
+        ["user_id", "delta", "reason", "created_at"],
+        select(users.c.id, users.c.points, literal(OPENING), literal(datetime.utcnow()))
+        .where(users.c.points != 0)
+        .where(~select(ledger.c.id).where(ledger.c.user_id == users.c.id).exists()),
+    ))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "indexes for login, order listings and pagination",
+        create_indexes(
+            "ix_users_name",
+            "ix_users_created_at_id",
+            "ix_orders_created_at_id",
+            "ix_orders_user_id_created_at_id",
+            "ix_order_items_order_id",
+        ),
+    ),
+    Migration(2, "backfill hourly sales rollups", rebuild_rollups),
+    Migration(3, "opening balances in the points ledger", open_points_ledger),
+    Migration(4, "points redeemed per order", add_columns("orders", "points_redeemed")),
+    Migration(5, "shared cache version counters", create_tables("cache_versions")),
+    Migration(
+        6,
+        "exact money totals in aggregates and rollups",
+        alter_column_types(
+            "user_stats.total_spent",
+            "sales_hourly.revenue",
+            "drink_sales_hourly.revenue",
+        ),
+    ),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def applied_versions(conn: Connection) -> set:
+    if not inspect(conn).has_table(schema_migrations.name):
+        return set()
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def schema_version(conn: Connection) -> Optional[int]:
+    """Latest applied migration, or None on a database never migrated"""
+    if not inspect(conn).has_table(schema_migrations.name):
+        return None
+    return conn.execute(select(func.max(schema_migrations.c.version))).scalar()
+
+
+def run_migrations(bind: Engine) -> List[Migration]:
+    """Apply pending migrations in order; returns the ones applied"""
+    migration_metadata.create_all(bind=bind)
+    with bind.connect() as conn:
+        done = applied_versions(conn)
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version in done:
+            continue
+        with bind.begin() as conn:
+            migration.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=migration.version,
+                name=migration.name,
+                applied_at=datetime.utcnow(),
+            ))
+        print(f"Applied migration {migration.version}: {migration.name}")
+        applied.append(migration)
+    return applied
+
+
+if __name__ == "__main__":
+    from database import Base, engine
+
+    if sys.argv[1:] == ["status"]:
+        with engine.connect() as conn:
+            done = applied_versions(conn)
+        for migration in MIGRATIONS:
+            state = "applied" if migration.version in done else "pending"
+            print(f"{migration.version:>4}  {state:<8} {migration.name}")
+    elif not sys.argv[1:]:
+        Base.metadata.create_all(bind=engine)
+        if not run_migrations(engine):
+            print("Schema is up to date")
+    else:
+        print("usage: python migrations.py [status]")
+        sys.exit(2)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, ForeignKey, DateTime, Text
+from sqlalchemy import Column, String, Integer, Float, ForeignKey, DateTime, Text, Index, Numeric
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -10,6 +10,11 @@ def generate_uuid():
     return str(uuid.uuid4())
 
 
+# Money amounts: exact NUMERIC on server databases (read back as Decimal),
+# REAL on SQLite, which has no decimal type, so existing files need no migration
+Money = Numeric(10, 2).with_variant(Float(), "sqlite")
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -20,7 +25,52 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     orders = relationship("Order", back_populates="user", cascade="all, delete-orphan")
+    stats = relationship("UserStats", uselist=False, cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Login looks users up by name
+        Index("ix_users_name", "name"),
+        # Keyset pagination of the admin user list
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
+
+
+class UserStats(Base):
+    """Lifetime order aggregates, maintained by create_order"""
+    __tablename__ = "user_stats"
+
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    total_spent = Column(Money, nullable=False, default=0)
+    total_points_earned = Column(Integer, nullable=False, default=0)
+    order_count = Column(Integer, nullable=False, default=0)
+    last_order_at = Column(DateTime, nullable=True)
+
 
+class PointsLedger(Base):
+    """Append-only record of every change to User.points"""
+    __tablename__ = "points_ledger"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    delta = Column(Integer, nullable=False)
+    reason = Column(String, nullable=False)
+    order_id = Column(String, ForeignKey("orders.id"), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # A user's history in insertion order
+        Index("ix_points_ledger_user_id_id", "user_id", "id"),
+    )
+
+
+class PointsSnapshot(Base):
+    """User balance as of a points_ledger entry, written periodically"""
+    __tablename__ = "points_snapshots"
+
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    ledger_id = Column(Integer, primary_key=True)
+    balance = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
 class Drink(Base):
     __tablename__ = "drinks"
@@ -64,13 +114,21 @@ class Order(Base):
 
     id = Column(String, primary_key=True, default=generate_uuid)
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
-    total = Column(Float, nullable=False, default=0)
+    total = Column(Money, nullable=False, default=0)
     points_earned = Column(Integer, default=0)
+    points_redeemed = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Keyset pagination of all orders and of a user's order history; the
+        # latter also serves any lookup by user_id or (user_id, created_at)
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -82,7 +140,51 @@ class OrderItem(Base):
     bean_option = Column(String, nullable=False)
     milk_option = Column(String, nullable=False)
     syrup_option = Column(String, nullable=False)
-    price = Column(Float, nullable=False)
+    price = Column(Money, nullable=False)
 
     order = relationship("Order", back_populates="items")
     drink = relationship("Drink", back_populates="order_items")
+
+    __table_args__ = (
+        # Loading the items of a page of orders
+        Index("ix_order_items_order_id", "order_id"),
+    )
+
+
+class SalesHourly(Base):
+    """Hourly sales rollup, maintained by create_order"""
+    __tablename__ = "sales_hourly"
+
+    hour = Column(DateTime, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    item_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Money, nullable=False, default=0)
+
+
+class DrinkSalesHourly(Base):
+    """Hourly per-drink sales rollup, maintained by create_order"""
+    __tablename__ = "drink_sales_hourly"
+
+    hour = Column(DateTime, primary_key=True)
+    drink_id = Column(String, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Money, nullable=False, default=0)
+
+
+class OptionSalesHourly(Base):
+    """Hourly bean/milk/syrup combination rollup, maintained by create_order"""
+    __tablename__ = "option_sales_hourly"
+
+    hour = Column(DateTime, primary_key=True)
+    bean_option = Column(String, primary_key=True)
+    milk_option = Column(String, primary_key=True)
+    syrup_option = Column(String, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+
+
+class CacheVersion(Base):
+    """Version counters shared by worker processes to invalidate their caches"""
+    __tablename__ = "cache_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
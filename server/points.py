@@ -0,0 +1,191 @@
+"""
+Loyalty points balance changes.
+
+``users.points`` is only ever changed in SQL, never by writing back a value
+read earlier, so concurrent orders cannot lose updates: awards are applied as
+``points = points + :delta``, redemptions as a decrement conditional on the
+balance covering it, and explicit edits as a compare-and-set on the value
+the caller saw. Every change is appended to ``points_ledger`` in the same
+transaction, so the ledger always sums to the balance.
+
+Every ``POINTS_SNAPSHOT_INTERVAL`` ledger entries a user's balance is
+snapshotted in ``points_snapshots``; a balance at any point in the history is
+the nearest earlier snapshot plus at most that many entries.
+"""
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+# Roubles of discount per redeemed point
+POINT_VALUE = float(os.getenv("POINT_VALUE", "1"))
+POINTS_SNAPSHOT_INTERVAL = int(os.getenv("POINTS_SNAPSHOT_INTERVAL", "100"))
+
+# Ledger reasons
+ORDER = "order"
+REDEEM = "redeem"
+ADJUSTMENT = "adjustment"
+OPENING = "opening"
+
+
+class InsufficientPoints(Exception):
+    """The balance does not cover a redemption"""
+
+
+def ledger_entry(
+    user_id: str,
+    delta: int,
+    reason: str,
+    order_id: Optional[str] = None,
+    created_at: Optional[datetime] = None,
+) -> dict:
+    return {
+        "user_id": user_id,
+        "delta": delta,
+        "reason": reason,
+        "order_id": order_id,
+        "created_at": created_at or datetime.utcnow(),
+    }
+
+
+async def increment_points(db: AsyncSession, entries: List[dict]):
+    """Add the entries' deltas to users.points atomically (no commit)"""
+    delta_by_user: Dict[str, int] = defaultdict(int)
+    for entry in entries:
+        delta_by_user[entry["user_id"]] += entry["delta"]
+    for user_id, delta in delta_by_user.items():
+        if delta:
+            await db.execute(
+                update(models.User)
+                .where(models.User.id == user_id)
+                .values(points=models.User.points + delta)
+            )
+
+
+async def redeem_points(db: AsyncSession, user_id: str, points: int):
+    """Take ``points`` off the balance if it covers them (no commit)"""
+    result = await db.execute(
+        update(models.User)
+        .where(models.User.id == user_id, models.User.points >= points)
+        .values(points=models.User.points - points)
+    )
+    if result.rowcount == 0:
+        raise InsufficientPoints(user_id)
+
+
+async def append_ledger(db: AsyncSession, entries: List[dict]):
+    """Record balance changes already applied to users.points (no commit)"""
+    if not entries:
+        return
+    await db.execute(insert(models.PointsLedger), entries)
+    await snapshot_balances(db, {entry["user_id"] for entry in entries})
+
+
+async def set_points(db: AsyncSession, user_id: str, expected: int, points: int) -> bool:
+    """
+    Set the balance to ``points`` if it is still ``expected`` (no commit).
+    Returns False when another transaction changed it first.
+    """
+    result = await db.execute(
+        update(models.User)
+        .where(models.User.id == user_id, models.User.points == expected)
+        .values(points=points)
+    )
+    if result.rowcount == 0:
+        return False
+    if points != expected:
+        await append_ledger(db, [ledger_entry(user_id, points - (expected or 0), ADJUSTMENT)])
+    return True
+
+
+async def _latest_snapshot(
+    db: AsyncSession, user_id: str, up_to: Optional[int] = None
+) -> Tuple[int, int]:
+    """(ledger_id, balance) of the newest snapshot at or before ``up_to``"""
+    snapshot = models.PointsSnapshot
+    stmt = (
+        select(snapshot.ledger_id, snapshot.balance)
+        .where(snapshot.user_id == user_id)
+        .order_by(snapshot.ledger_id.desc())
+        .limit(1)
+    )
+    if up_to is not None:
+        stmt = stmt.where(snapshot.ledger_id <= up_to)
+    row = (await db.execute(stmt)).first()
+    return (row.ledger_id, row.balance) if row else (0, 0)
+
+
+async def snapshot_balances(db: AsyncSession, user_ids: Iterable[str]):
+    """Snapshot each balance once POINTS_SNAPSHOT_INTERVAL entries follow the last one"""
+    ledger = models.PointsLedger
+    for user_id in user_ids:
+        ledger_id, balance = await _latest_snapshot(db, user_id)
+        await db.execute(
+            insert(models.PointsSnapshot).from_select(
+                ["user_id", "ledger_id", "balance", "created_at"],
+                select(
+                    literal(user_id),
+                    func.max(ledger.id),
+                    balance + func.sum(ledger.delta),
+                    literal(datetime.utcnow()),
+                )
+                .where(ledger.user_id == user_id, ledger.id > ledger_id)
+                .having(func.count() >= POINTS_SNAPSHOT_INTERVAL),
+            )
+        )
+
+
+async def ledger_balance(db: AsyncSession, user_id: str, up_to: Optional[int] = None) -> int:
+    """Balance after ledger entry ``up_to`` (default: the latest entry)"""
+    ledger = models.PointsLedger
+    ledger_id, balance = await _latest_snapshot(db, user_id, up_to)
+    stmt = select(func.coalesce(func.sum(ledger.delta), 0)).where(
+        ledger.user_id == user_id, ledger.id > ledger_id
+    )
+    if up_to is not None:
+        stmt = stmt.where(ledger.id <= up_to)
+    return balance + (await db.execute(stmt)).scalar_one()
+
+
+async def points_history(
+    db: AsyncSession, user_id: str, limit: int, cursor: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """A page of ledger entries, newest first, each with the balance after it"""
+    ledger = models.PointsLedger
+    stmt = (
+        select(ledger.id, ledger.delta, ledger.reason, ledger.order_id, ledger.created_at)
+        .where(ledger.user_id == user_id)
+        .order_by(ledger.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        if not cursor.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(ledger.id < int(cursor))
+    rows = (await db.execute(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].id)
+
+    entries = []
+    if rows:
+        balance = await ledger_balance(db, user_id, up_to=rows[0].id)
+        for entry_id, delta, reason, order_id, created_at in rows:
+            entries.append({
+                "id": entry_id,
+                "delta": delta,
+                "reason": reason,
+                "order_id": order_id,
+                "created_at": created_at,
+                "balance": balance,
+            })
+            balance -= delta
+    return entries, next_cursor
@@ -0,0 +1,77 @@
+"""
+Shared query building blocks for the routers.
+"""
+import base64
+import os
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+
+import models
+
+# How order items and their drinks are loaded for order listings:
+# "selectin" issues one extra IN query per relationship level, "joined"
+# pulls everything in a single LEFT OUTER JOIN.
+ORDER_ITEMS_LOADING = os.getenv("ORDER_ITEMS_LOADING", "selectin")
+
+
+def order_loader_options(strategy: str = None):
+    """Loader options that fetch Order.items and OrderItem.drink eagerly"""
+    strategy = strategy or ORDER_ITEMS_LOADING
+    if strategy == "joined":
+        return [joinedload(models.Order.items).joinedload(models.OrderItem.drink)]
+    if strategy == "selectin":
+        return [selectinload(models.Order.items).selectinload(models.OrderItem.drink)]
+    raise ValueError(f"Unknown ORDER_ITEMS_LOADING strategy: {strategy}")
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), row_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def keyset_page(
+    db: AsyncSession, stmt, model, limit: int, cursor: Optional[str] = None,
+    columns: bool = False
+):
+    """
+    Fetch one page of ``stmt`` newest first, keyed on (created_at, id).
+
+    Returns the rows and the cursor for the next page (None on the last
+    page). Each page is an index range scan, so its cost does not grow
+    with the table. With ``columns=True`` the statement selects plain
+    columns (which must include id and created_at) and rows are returned
+    as tuples instead of ORM objects.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            tuple_(model.created_at, model.id) < tuple_(created_at, row_id)
+        )
+    result = await db.execute(
+        stmt.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+    )
+    rows = result.all() if columns else result.unique().scalars().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
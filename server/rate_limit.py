@@ -0,0 +1,197 @@
+"""
+Rate limiting and load shedding.
+
+``RateLimiter`` is a dependency attached to a router (or a single route) that
+keeps a token bucket per client IP and, optionally, per user. A request that
+finds its bucket empty gets 429 with ``Retry-After`` before any other
+dependency runs, so it never opens a database session. Buckets live in
+process memory, bounded by ``RATE_LIMIT_MAX_KEYS`` (least recently used keys
+are forgotten, i.e. start with a full bucket again).
+
+Limits are ``"rate:burst"`` strings, tokens per second and bucket size, and
+each can be overridden with the environment variable of the same name, or
+turned off with ``"off"``. ``RATE_LIMIT_ENABLED=0`` disables all of them.
+
+``LoadShedder`` is ASGI middleware capping the number of API requests in
+progress at ``LOAD_SHED_MAX_IN_FLIGHT``; excess requests get 503 at once
+instead of queueing for the database.
+
+The client IP is the socket peer as uvicorn reports it. Behind a reverse
+proxy it must be told to trust the proxy (``--forwarded-allow-ips``, set from
+``FORWARDED_ALLOW_IPS`` in the Docker image) so it reflects
+``X-Forwarded-For``; otherwise every client shares the proxy's buckets.
+"""
+import math
+import os
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional
+
+import orjson
+from fastapi import HTTPException, Request
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+LOAD_SHED_MAX_IN_FLIGHT = int(os.getenv("LOAD_SHED_MAX_IN_FLIGHT", "256"))
+# Long-lived responses that would otherwise hold a slot for their lifetime
+LOAD_SHED_EXEMPT = ("/api/admin/orders/stream", "/api/admin/orders/export")
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float
+    burst: int
+
+
+def limit_from_env(name: str, default: str) -> Optional[Limit]:
+    value = os.getenv(name, default)
+    if not RATE_LIMIT_ENABLED or value == "off":
+        return None
+    rate, _, burst = value.partition(":")
+    return Limit(float(rate), int(burst or max(1, math.ceil(float(rate)))))
+
+
+# Many customers can share one address (café Wi-Fi, mobile carrier NAT)
+LOGIN_IP = limit_from_env("RATE_LIMIT_LOGIN_IP", "2:60")
+USERS_IP = limit_from_env("RATE_LIMIT_USERS_IP", "20:40")
+USERS_USER = limit_from_env("RATE_LIMIT_USERS_USER", "5:20")
+ADMIN_IP = limit_from_env("RATE_LIMIT_ADMIN_IP", "20:40")
+ADMIN_LOGIN_IP = limit_from_env("RATE_LIMIT_ADMIN_LOGIN_IP", "0.1:5")
+MENU_IP = limit_from_env("RATE_LIMIT_MENU_IP", "50:100")
+
+
+class BucketStore:
+    """LRU-bounded token buckets, stored as [tokens, last refill time]"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[Hashable, List[float]]" = OrderedDict()
+
+    def take(self, key: Hashable, limit: Limit) -> float:
+        """Consume a token; returns 0, or the seconds until one is available"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(limit.burst), now]
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) / limit.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+buckets = BucketStore(RATE_LIMIT_MAX_KEYS)
+limited: Dict[str, int] = defaultdict(int)
+
+
+class RateLimiter:
+    """Dependency enforcing per-IP and per-user token buckets"""
+
+    def __init__(
+        self,
+        name: str,
+        ip: Optional[Limit] = None,
+        user: Optional[Limit] = None,
+        user_key: Optional[Callable[[Request], Optional[str]]] = None,
+    ):
+        self.name = name
+        self.ip = ip
+        self.user = user
+        self.user_key = user_key
+
+    async def __call__(self, request: Request):
+        if self.ip is not None:
+            host = request.client.host if request.client else "unknown"
+            self._take("ip", host, self.ip)
+        if self.user is not None and self.user_key is not None:
+            user_id = self.user_key(request)
+            if user_id is not None:
+                self._take("user", user_id, self.user)
+
+    def _take(self, scope: str, key: str, limit: Limit):
+        wait = buckets.take((self.name, scope, key), limit)
+        if wait:
+            limited[f"{self.name}.{scope}"] += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+
+class InFlight:
+    """Counters shared by the load shedder and the stats endpoint"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.current = 0
+        self.max_seen = 0
+        self.shed = 0
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.limit,
+            "in_flight": self.current,
+            "max_seen": self.max_seen,
+            "shed": self.shed,
+        }
+
+
+in_flight = InFlight(LOAD_SHED_MAX_IN_FLIGHT)
+
+
+class LoadShedder:
+    """ASGI middleware rejecting API requests beyond a concurrency cap"""
+
+    def __init__(self, app, counters: InFlight = in_flight):
+        self.app = app
+        self.counters = counters
+
+    async def __call__(self, scope, receive, send):
+        counters = self.counters
+        if (
+            scope["type"] != "http"
+            or counters.limit <= 0
+            or not scope["path"].startswith("/api/")
+            or scope["path"].startswith(LOAD_SHED_EXEMPT)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if counters.current >= counters.limit:
+            counters.shed += 1
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [(b"content-type", b"application/json"), (b"retry-after", b"1")],
+            })
+            await send({
+                "type": "http.response.body",
+                "body": orjson.dumps({"detail": "Server busy, retry shortly"}),
+            })
+            return
+
+        counters.current += 1
+        counters.max_seen = max(counters.max_seen, counters.current)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            counters.current -= 1
+
+
+def stats() -> dict:
+    return {
+        "enabled": RATE_LIMIT_ENABLED,
+        "buckets": len(buckets),
+        "limited": dict(limited),
+        "load_shedding": in_flight.stats(),
+    }
@@ -0,0 +1,248 @@
+"""
+Hourly sales rollups behind the analytics endpoints.
+
+``record_sales`` folds newly written orders into ``sales_hourly``,
+``drink_sales_hourly`` and ``option_sales_hourly`` in the same transaction
+as the orders, using one upsert per table. ``rebuild_rollups`` recomputes
+them from the order history; migration 2 runs it once on existing databases
+and it is available as a command:
+
+    python rollups.py rebuild
+
+Analytics queries group the rollups, never the raw orders, so their cost
+depends on the number of hours in the range rather than on order volume.
+Ranges are bucketed to whole hours.
+"""
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from database import dialect_insert
+
+sales_table = models.SalesHourly.__table__
+drink_sales_table = models.DrinkSalesHourly.__table__
+option_sales_table = models.OptionSalesHourly.__table__
+
+
+def hour_of(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class SalesAggregate:
+    """Rollup increments accumulated in memory before being written"""
+
+    def __init__(self):
+        self.sales: Dict[datetime, List] = defaultdict(lambda: [0, 0, 0.0])
+        self.drinks: Dict[Tuple, List] = defaultdict(lambda: [0, 0.0])
+        self.options: Dict[Tuple, int] = defaultdict(int)
+
+    def add_order(self, created_at: datetime, total: float, items: Iterable[dict]):
+        hour = hour_of(created_at)
+        sales = self.sales[hour]
+        sales[0] += 1
+        sales[2] += float(total)
+        for item in items:
+            self.add_item(hour, item)
+            sales[1] += item["quantity"]
+
+    def add_item(self, hour: datetime, item: dict):
+        drink = self.drinks[(hour, item["drink_id"])]
+        drink[0] += item["quantity"]
+        drink[1] += float(item["price"]) * item["quantity"]
+        combination = (hour, item["bean_option"], item["milk_option"], item["syrup_option"])
+        self.options[combination] += item["quantity"]
+
+    def rows(self):
+        """(table, rows) pairs ready for an upsert"""
+        return [
+            (sales_table, [
+                {"hour": hour, "order_count": orders, "item_count": items, "revenue": revenue}
+                for hour, (orders, items, revenue) in self.sales.items()
+            ]),
+            (drink_sales_table, [
+                {"hour": hour, "drink_id": drink_id, "quantity": quantity, "revenue": revenue}
+                for (hour, drink_id), (quantity, revenue) in self.drinks.items()
+            ]),
+            (option_sales_table, [
+                {"hour": hour, "bean_option": bean, "milk_option": milk,
+                 "syrup_option": syrup, "quantity": quantity}
+                for (hour, bean, milk, syrup), quantity in self.options.items()
+            ]),
+        ]
+
+
+def increment_upsert(dialect_name: str, table):
+    """INSERT ... ON CONFLICT (primary key) DO UPDATE adding to the counters"""
+    stmt = dialect_insert(dialect_name, table)
+    keys = [column.name for column in table.primary_key.columns]
+    return stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            column.name: column + stmt.excluded[column.name]
+            for column in table.columns
+            if column.name not in keys
+        },
+    )
+
+
+async def record_sales(db: AsyncSession, orders):
+    """Fold persisted PendingOrders into the hourly rollups (no commit)"""
+    aggregate = SalesAggregate()
+    for order in orders:
+        aggregate.add_order(order.created_at, order.total, order.item_rows)
+    dialect_name = db.bind.dialect.name
+    for table, rows in aggregate.rows():
+        if rows:
+            await db.execute(increment_upsert(dialect_name, table), rows)
+
+
+def rebuild_rollups(conn: Connection):
+    """Recompute all rollups from orders and order_items"""
+    aggregate = SalesAggregate()
+    for created_at, total in conn.execute(
+        select(models.Order.created_at, models.Order.total)
+    ):
+        aggregate.add_order(created_at, total, [])
+    items = conn.execute(
+        select(
+            models.Order.created_at,
+            models.OrderItem.drink_id,
+            models.OrderItem.quantity,
+            models.OrderItem.price,
+            models.OrderItem.bean_option,
+            models.OrderItem.milk_option,
+            models.OrderItem.syrup_option,
+        )
+        .join(models.Order, models.Order.id == models.OrderItem.order_id)
+        .execution_options(yield_per=10000)
+    )
+    for created_at, drink_id, quantity, price, bean, milk, syrup in items:
+        hour = hour_of(created_at)
+        aggregate.sales[hour][1] += quantity
+        aggregate.add_item(hour, {
+            "drink_id": drink_id, "quantity": quantity, "price": price,
+            "bean_option": bean, "milk_option": milk, "syrup_option": syrup,
+        })
+
+    for table, rows in aggregate.rows():
+        conn.execute(delete(table))
+        if rows:
+            conn.execute(table.insert(), rows)
+
+
+def _in_range(stmt, hour_column, start: Optional[datetime], end: Optional[datetime]):
+    if start is not None:
+        stmt = stmt.where(hour_column >= hour_of(start))
+    if end is not None:
+        stmt = stmt.where(hour_column < end)
+    return stmt
+
+
+async def revenue_series(
+    db: AsyncSession, granularity: str, start: Optional[datetime], end: Optional[datetime]
+) -> List[dict]:
+    """Orders, items and revenue per hour or per day"""
+    hour = sales_table.c.hour
+    period = hour if granularity == "hour" else func.date(hour)
+    stmt = _in_range(
+        select(
+            period.label("period"),
+            func.sum(sales_table.c.order_count),
+            func.sum(sales_table.c.item_count),
+            func.sum(sales_table.c.revenue),
+        ).group_by(period).order_by(period),
+        hour, start, end,
+    )
+    return [
+        {"period": period, "orders": orders, "items": items, "revenue": round(float(revenue), 2)}
+        for period, orders, items, revenue in await db.execute(stmt)
+    ]
+
+
+async def top_drinks(
+    db: AsyncSession, limit: int, start: Optional[datetime], end: Optional[datetime]
+) -> List[dict]:
+    quantity = func.sum(drink_sales_table.c.quantity).label("quantity")
+    stmt = _in_range(
+        select(
+            drink_sales_table.c.drink_id,
+            models.Drink.name,
+            quantity,
+            func.sum(drink_sales_table.c.revenue),
+        )
+        .outerjoin(models.Drink, models.Drink.id == drink_sales_table.c.drink_id)
+        .group_by(drink_sales_table.c.drink_id, models.Drink.name)
+        .order_by(quantity.desc())
+        .limit(limit),
+        drink_sales_table.c.hour, start, end,
+    )
+    return [
+        {
+            "drink_id": drink_id, "name": name, "quantity": quantity,
+            "revenue": round(float(revenue), 2),
+        }
+        for drink_id, name, quantity, revenue in await db.execute(stmt)
+    ]
+
+
+async def top_combinations(
+    db: AsyncSession, limit: int, start: Optional[datetime], end: Optional[datetime]
+) -> List[dict]:
+    """Most ordered bean/milk/syrup combinations"""
+    options = (
+        option_sales_table.c.bean_option,
+        option_sales_table.c.milk_option,
+        option_sales_table.c.syrup_option,
+    )
+    quantity = func.sum(option_sales_table.c.quantity).label("quantity")
+    stmt = _in_range(
+        select(*options, quantity).group_by(*options).order_by(quantity.desc()).limit(limit),
+        option_sales_table.c.hour, start, end,
+    )
+    return [
+        {"bean_option": bean, "milk_option": milk, "syrup_option": syrup, "quantity": quantity}
+        for bean, milk, syrup, quantity in await db.execute(stmt)
+    ]
+
+
+async def basket_summary(
+    db: AsyncSession, start: Optional[datetime], end: Optional[datetime]
+) -> dict:
+    """Average items and value per order"""
+    stmt = _in_range(
+        select(
+            func.coalesce(func.sum(sales_table.c.order_count), 0),
+            func.coalesce(func.sum(sales_table.c.item_count), 0),
+            func.coalesce(func.sum(sales_table.c.revenue), 0),
+        ),
+        sales_table.c.hour, start, end,
+    )
+    orders, items, revenue = (await db.execute(stmt)).one()
+    # NUMERIC sums come back as Decimal, which orjson does not serialize
+    revenue = float(revenue)
+    return {
+        "orders": orders,
+        "items": items,
+        "revenue": round(revenue, 2),
+        "avg_items_per_order": items / orders if orders else 0,
+        "avg_order_value": round(revenue / orders, 2) if orders else 0,
+    }
+
+
+if __name__ == "__main__":
+    from database import Base, engine
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python rollups.py rebuild")
+        sys.exit(2)
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        rebuild_rollups(conn)
+    print("Sales rollups rebuilt")
@@ -1,16 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from datetime import datetime, timedelta
 import jwt
 import hashlib
 
 import models
 import schemas
+from auth_cache import decode_token, token_cache, user_cache
 from database import get_db
+from events import order_feed
+from exports import stream_orders_export
+from idempotency import order_idempotency
+from menu_cache import bump_menu_version, menu_cache, menu_watcher
+from order_queue import order_batcher
+import rate_limit
+import rollups
+from queries import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page
+from serializers import (
+    DRINK_COLUMNS, ORDER_COLUMNS, USER_COLUMNS, ORJSONResponse, drink_row, order_rows, user_row
+)
 
-router = APIRouter(prefix="/api/admin", tags=["admin"])
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"],
+    dependencies=[Depends(rate_limit.RateLimiter("admin", ip=rate_limit.ADMIN_IP))],
+)
+login_rate_limit = rate_limit.RateLimiter("admin_login", ip=rate_limit.ADMIN_LOGIN_IP)
 
 # Simple JWT-like auth (for demo purposes)
 SECRET_KEY = "coffee-shop-secret-key-change-in-production"
@@ -34,7 +53,7 @@ def create_access_token(data: dict) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> str:
     if credentials is None:
@@ -46,7 +65,7 @@ def get_current_user(
     
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token, SECRET_KEY, ALGORITHM)
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(
@@ -63,8 +82,13 @@ def get_current_user(
         )
 
 
-@router.post("/login")
-def admin_login(credentials: schemas.AdminLogin):
+def page_response(rows: list, next_cursor: Optional[str]) -> ORJSONResponse:
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return ORJSONResponse(rows, headers=headers)
+
+
+@router.post("/login", dependencies=[Depends(login_rate_limit)])
+async def admin_login(credentials: schemas.AdminLogin):
     """Admin login endpoint"""
     print(f"Login attempt: username={credentials.username}, password={credentials.password}")
     print(f"Expected username: {ADMIN_USERNAME}")
@@ -83,58 +107,173 @@ def admin_login(credentials: schemas.AdminLogin):
 
 
 @router.get("/orders", response_model=List[schemas.OrderResponse])
-def get_all_orders(
+async def get_all_orders(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     username: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
+):
+    """Get orders newest first, one page at a time (admin only)"""
+    orders, next_cursor = await keyset_page(
+        db, select(*ORDER_COLUMNS), models.Order, limit, cursor, columns=True
+    )
+    return page_response(await order_rows(db, orders), next_cursor)
+
+
+@router.get("/orders/stream")
+async def stream_orders(
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    username: str = Depends(get_current_user)
+):
+    """Live feed of new orders as Server-Sent Events (admin only)"""
+    return StreamingResponse(
+        order_feed.stream(last_event_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/orders/export")
+async def export_orders(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    gzip: bool = False,
+    username: str = Depends(get_current_user)
 ):
-    """Get all orders (admin only)"""
-    orders = db.query(models.Order).order_by(models.Order.created_at.desc()).all()
-    return orders
+    """Stream order items in [start, end) as CSV or NDJSON (admin only)"""
+    filename = f"orders.{format}" + (".gz" if gzip else "")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_orders_export(format, start, end, gzip),
+        media_type="application/gzip" if gzip else media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @router.get("/users", response_model=List[schemas.UserResponse])
-def get_all_users(
+async def get_all_users(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    username: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get users newest first, one page at a time (admin only)"""
+    users, next_cursor = await keyset_page(
+        db, select(*USER_COLUMNS), models.User, limit, cursor, columns=True
+    )
+    return page_response([user_row(*user) for user in users], next_cursor)
+
+
+@router.get("/stats")
+async def get_stats(username: str = Depends(get_current_user)):
+    """Internal counters for monitoring (admin only)"""
+    return {
+        "order_queue": order_batcher.stats(),
+        "token_cache": token_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "order_feed": order_feed.stats(),
+        "order_idempotency": order_idempotency.stats(),
+        "rate_limit": rate_limit.stats(),
+        "menu_cache": menu_watcher.stats(),
+    }
+
+
+@router.get("/analytics/revenue")
+async def get_revenue(
+    granularity: str = Query("hour", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    username: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Revenue per hour or day in [start, end) (admin only)"""
+    return ORJSONResponse(await rollups.revenue_series(db, granularity, start, end))
+
+
+@router.get("/analytics/top-drinks")
+async def get_top_drinks(
+    limit: int = Query(10, ge=1, le=100),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    username: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Best selling drinks by quantity (admin only)"""
+    return ORJSONResponse(await rollups.top_drinks(db, limit, start, end))
+
+
+@router.get("/analytics/combinations")
+async def get_top_combinations(
+    limit: int = Query(10, ge=1, le=100),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    username: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Most popular bean/milk/syrup combinations (admin only)"""
+    return ORJSONResponse(await rollups.top_combinations(db, limit, start, end))
+
+
+@router.get("/analytics/basket")
+async def get_basket(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    username: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Average basket size and order value (admin only)"""
+    return ORJSONResponse(await rollups.basket_summary(db, start, end))
+
+
+@router.get("/analytics/summary")
+async def get_summary(
     username: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get all users (admin only)"""
-    users = db.query(models.User).all()
-    return users
+    """All-time order, revenue and user totals for the dashboard (admin only)"""
+    summary = await rollups.basket_summary(db, None, None)
+    summary["users"] = (
+        await db.execute(select(func.count()).select_from(models.User))
+    ).scalar_one()
+    return ORJSONResponse(summary)
 
 
 @router.get("/drinks", response_model=List[schemas.DrinkResponse])
-def get_all_drinks_admin(
+async def get_all_drinks_admin(
     username: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all drinks including inactive (admin only)"""
-    drinks = db.query(models.Drink).all()
-    return drinks
+    result = await db.execute(select(*DRINK_COLUMNS))
+    return ORJSONResponse([drink_row(*drink) for drink in result])
 
 
 @router.post("/drinks", response_model=schemas.DrinkResponse)
-def create_drink_admin(
+async def create_drink_admin(
     drink: schemas.DrinkCreate,
     username: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new drink (admin only)"""
     db_drink = models.Drink(**drink.model_dump())
     db.add(db_drink)
-    db.commit()
-    db.refresh(db_drink)
+    await bump_menu_version(db)
+    await db.commit()
+    menu_cache.invalidate()
     return db_drink
 
 
 @router.put("/drinks/{drink_id}", response_model=schemas.DrinkResponse)
-def update_drink_admin(
+async def update_drink_admin(
     drink_id: str,
     drink_update: schemas.DrinkUpdate,
     username: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a drink (admin only)"""
-    db_drink = db.query(models.Drink).filter(models.Drink.id == drink_id).first()
+    db_drink = await db.get(models.Drink, drink_id)
     if not db_drink:
         raise HTTPException(status_code=404, detail="Drink not found")
     
@@ -142,22 +281,25 @@ def update_drink_admin(
     for field, value in update_data.items():
         setattr(db_drink, field, value)
     
-    db.commit()
-    db.refresh(db_drink)
+    await bump_menu_version(db)
+    await db.commit()
+    menu_cache.invalidate()
     return db_drink
 
 
 @router.delete("/drinks/{drink_id}")
-def delete_drink_admin(
+async def delete_drink_admin(
     drink_id: str,
     username: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a drink (admin only)"""
-    db_drink = db.query(models.Drink).filter(models.Drink.id == drink_id).first()
+    db_drink = await db.get(models.Drink, drink_id)
     if not db_drink:
         raise HTTPException(status_code=404, detail="Drink not found")
     
-    db.delete(db_drink)
-    db.commit()
+    await db.delete(db_drink)
+    await bump_menu_version(db)
+    await db.commit()
+    menu_cache.invalidate()
     return {"message": "Drink deleted"}
@@ -1,49 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
 from typing import List
 
-import models
 import schemas
-from database import get_db
+from menu_cache import menu_cache, cached_response
+from rate_limit import MENU_IP, RateLimiter
 
-router = APIRouter(prefix="/api/drinks", tags=["drinks"])
+router = APIRouter(
+    prefix="/api/drinks",
+    tags=["drinks"],
+    dependencies=[Depends(RateLimiter("drinks", ip=MENU_IP))],
+)
 
 
 @router.get("", response_model=List[schemas.DrinkResponse])
-def get_all_drinks(db: Session = Depends(get_db)):
+async def get_all_drinks(request: Request):
     """Get all available drinks"""
-    drinks = db.query(models.Drink).filter(models.Drink.is_active == 1).all()
-    return drinks
+    snapshot = await menu_cache.aget()
+    return cached_response(request, snapshot.drinks)
 
 
 @router.get("/{drink_id}", response_model=schemas.DrinkResponse)
-def get_drink(drink_id: str, db: Session = Depends(get_db)):
+async def get_drink(drink_id: str, request: Request):
     """Get a specific drink by ID"""
-    drink = db.query(models.Drink).filter(
-        models.Drink.id == drink_id,
-        models.Drink.is_active == 1
-    ).first()
-    if not drink:
+    snapshot = await menu_cache.aget()
+    payload = snapshot.drink_by_id.get(drink_id)
+    if not payload:
         raise HTTPException(status_code=404, detail="Drink not found")
-    return drink
+    return cached_response(request, payload)
 
 
 @router.get("/options/beans", response_model=List[schemas.OptionResponse])
-def get_bean_options(db: Session = Depends(get_db)):
+async def get_bean_options(request: Request):
     """Get all bean options"""
-    options = db.query(models.BeanOption).all()
-    return options
+    snapshot = await menu_cache.aget()
+    return cached_response(request, snapshot.beans)
 
 
 @router.get("/options/milk", response_model=List[schemas.OptionResponse])
-def get_milk_options(db: Session = Depends(get_db)):
+async def get_milk_options(request: Request):
     """Get all milk options"""
-    options = db.query(models.MilkOption).all()
-    return options
+    snapshot = await menu_cache.aget()
+    return cached_response(request, snapshot.milk)
 
 
 @router.get("/options/syrups", response_model=List[schemas.OptionResponse])
-def get_syrup_options(db: Session = Depends(get_db)):
+async def get_syrup_options(request: Request):
     """Get all syrup options"""
-    options = db.query(models.SyrupOption).all()
-    return options
+    snapshot = await menu_cache.aget()
+    return cached_response(request, snapshot.syrups)
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends, Request
+
+import schemas
+from menu_cache import menu_cache, cached_response
+from rate_limit import MENU_IP, RateLimiter
+
+router = APIRouter(
+    prefix="/api/menu",
+    tags=["menu"],
+    dependencies=[Depends(RateLimiter("menu", ip=MENU_IP))],
+)
+
+
+@router.get("", response_model=schemas.MenuResponse)
+async def get_menu(request: Request):
+    """Get active drinks and all customization options in one response"""
+    snapshot = await menu_cache.aget()
+    return cached_response(request, snapshot.menu)
@@ -1,21 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
 from datetime import datetime, timedelta
 import jwt
 import hashlib
 
 import models
 import schemas
-from database import get_db, SessionLocal
-
-router = APIRouter(prefix="/api/users", tags=["users"])
+from auth_cache import cache_user, decode_token, user_cache
+from database import get_db
+from events import order_feed
+from idempotency import IDEMPOTENCY_KEY_MAX_LENGTH, order_idempotency
+from loyalty import get_user_stats
+from menu_cache import CatalogSnapshot, menu_cache
+from order_queue import PendingOrder, order_batcher, persist_orders
+from points import (
+    OPENING, POINT_VALUE, InsufficientPoints, ledger_balance, ledger_entry, points_history,
+    set_points,
+)
+from queries import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, order_loader_options
+from rate_limit import LOGIN_IP, USERS_IP, USERS_USER, RateLimiter
+from serializers import ORDER_COLUMNS, ORJSONResponse, order_rows
 
 # User auth
 USER_SECRET_KEY = "coffee-shop-user-secret-key-change-in-production"
 USER_ALGORITHM = "HS256"
 
+
+def rate_limit_user(request: Request) -> Optional[str]:
+    """The user a request acts for: the bearer token's, else the path's"""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            return decode_token(authorization[7:], USER_SECRET_KEY, USER_ALGORITHM).get("sub")
+        except jwt.PyJWTError:
+            pass
+    return request.path_params.get("user_id")
+
+
+router = APIRouter(
+    prefix="/api/users",
+    tags=["users"],
+    dependencies=[Depends(
+        RateLimiter("users", ip=USERS_IP, user=USERS_USER, user_key=rate_limit_user)
+    )],
+)
+# Stricter limit for logins, which create a user for every unseen name
+login_rate_limit = RateLimiter("login", ip=LOGIN_IP)
+
 security = HTTPBearer(auto_error=False)
 
 
@@ -25,84 +59,87 @@ def create_user_access_token(user_id: str) -> str:
     return jwt.encode(to_encode, USER_SECRET_KEY, algorithm=USER_ALGORITHM)
 
 
-def get_current_user_id(
+async def get_current_user_id(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
 ) -> Optional[str]:
     if credentials is None:
         return None
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, USER_SECRET_KEY, algorithms=[USER_ALGORITHM])
+        payload = decode_token(token, USER_SECRET_KEY, USER_ALGORITHM)
         user_id: str = payload.get("sub")
         return user_id
     except jwt.PyJWTError:
         return None
 
 
+async def load_user(db: AsyncSession, user_id: str) -> schemas.UserResponse:
+    """Fetch a user through the short-lived user cache"""
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    user = await db.get(models.User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    response = schemas.UserResponse.model_validate(user)
+    cache_user(user_id, response)
+    return response
+
+
 def calculate_points(total: float) -> int:
-    """Calculate loyalty points: 10% of order total"""
+    """Calculate loyalty points: 10% of the amount paid"""
     return int(total * 0.1)
 
 
-@router.post("/login", response_model=dict)
-def user_login(credentials: schemas.UserBase):
+@router.post("/login", response_model=dict, dependencies=[Depends(login_rate_limit)])
+async def user_login(credentials: schemas.UserBase, db: AsyncSession = Depends(get_db)):
     """
     Login or register a user.
     If user exists by name, return existing user.
     If not, create new user.
     """
-    db = SessionLocal()
-    try:
-        # Try to find existing user by name
-        user = db.query(models.User).filter(
-            models.User.name == credentials.name
-        ).first()
-
-        if user:
-            # Existing user - return token
-            access_token = create_user_access_token(user.id)
-            return {"access_token": access_token, "token_type": "bearer", "user_id": user.id}
-        else:
-            # New user - create and return token
-            new_user = models.User(
-                name=credentials.name,
-                points=0,
-                avatar=credentials.avatar
-            )
-            db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
-            access_token = create_user_access_token(new_user.id)
-            return {"access_token": access_token, "token_type": "bearer", "user_id": new_user.id}
-    finally:
-        db.close()
+    # Try to find existing user by name
+    result = await db.execute(
+        select(models.User).where(models.User.name == credentials.name)
+    )
+    user = result.scalars().first()
+
+    if user:
+        # Existing user - return token
+        access_token = create_user_access_token(user.id)
+        return {"access_token": access_token, "token_type": "bearer", "user_id": user.id}
+    else:
+        # New user - create and return token
+        new_user = models.User(
+            name=credentials.name,
+            points=0,
+            avatar=credentials.avatar
+        )
+        db.add(new_user)
+        await db.commit()
+        access_token = create_user_access_token(new_user.id)
+        return {"access_token": access_token, "token_type": "bearer", "user_id": new_user.id}
 
 
 @router.get("/me", response_model=schemas.UserResponse)
-def get_current_user_profile(
-    db: Session = Depends(get_db),
+async def get_current_user_profile(
+    db: AsyncSession = Depends(get_db),
     user_id: Optional[str] = Depends(get_current_user_id)
 ):
     """Get current authenticated user"""
     if not user_id:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return await load_user(db, user_id)
 
 
 @router.get("/{user_id}", response_model=schemas.UserResponse)
-def get_user(user_id: str, db: Session = Depends(get_db)):
+async def get_user(user_id: str, db: AsyncSession = Depends(get_db)):
     """Get user by ID"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return await load_user(db, user_id)
 
 
 @router.post("", response_model=schemas.UserResponse)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     """Create a new user"""
     db_user = models.User(
         name=user.name,
@@ -110,40 +147,63 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         avatar=user.avatar
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()
+    if db_user.points:
+        db.add(models.PointsLedger(**ledger_entry(db_user.id, db_user.points, OPENING)))
+    await db.commit()
     return db_user
 
 
 @router.put("/{user_id}", response_model=schemas.UserResponse)
-def update_user(user_id: str, user_update: schemas.UserUpdate, db: Session = Depends(get_db)):
+async def update_user(user_id: str, user_update: schemas.UserUpdate, db: AsyncSession = Depends(get_db)):
     """Update user information"""
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    db_user = await db.get(models.User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
     update_data = user_update.model_dump(exclude_unset=True)
+    points = update_data.pop("points", None)
+    expected_points = update_data.pop("expected_points", None)
+    if expected_points is None:
+        # Not given (or sent as null): compare against the balance we read
+        expected_points = db_user.points
     for field, value in update_data.items():
         setattr(db_user, field, value)
 
-    db.commit()
-    db.refresh(db_user)
+    # Orders may award points concurrently: only set the balance if it is
+    # still the one the client saw (or we read), and record the difference
+    if points is not None and not await set_points(db, user_id, expected_points, points):
+        raise HTTPException(
+            status_code=409,
+            detail="Points changed concurrently, reload and retry"
+        )
+
+    await db.commit()
+    user_cache.invalidate(user_id)
     return db_user
 
 
 @router.get("/{user_id}/profile", response_model=schemas.UserProfileResponse)
-def get_user_profile(user_id: str, db: Session = Depends(get_db)):
-    """Get user profile with order history"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+async def get_user_profile(
+    user_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get user profile with one page of order history, newest first"""
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    orders = db.query(models.Order).filter(
-        models.Order.user_id == user_id
-    ).order_by(models.Order.created_at.desc()).all()
+    orders, next_cursor = await keyset_page(
+        db,
+        select(models.Order).options(*order_loader_options()).where(
+            models.Order.user_id == user_id
+        ),
+        models.Order, limit, cursor
+    )
 
-    total_spent = sum(order.total for order in orders)
-    total_points_earned = sum(order.points_earned for order in orders)
+    stats = await get_user_stats(db, user_id)
 
     order_history = []
     for order in orders:
@@ -158,70 +218,175 @@ def get_user_profile(user_id: str, db: Session = Depends(get_db)):
     return schemas.UserProfileResponse(
         user=user,
         orderHistory=order_history,
-        totalSpent=total_spent,
-        totalPointsEarned=total_points_earned
+        totalSpent=stats.total_spent,
+        totalPointsEarned=stats.total_points_earned,
+        orderCount=stats.order_count,
+        lastOrderAt=stats.last_order_at,
+        nextCursor=next_cursor
     )
 
 
 @router.get("/{user_id}/orders", response_model=List[schemas.OrderResponse])
-def get_user_orders(user_id: str, db: Session = Depends(get_db)):
-    """Get all orders for a user"""
-    orders = db.query(models.Order).filter(
-        models.Order.user_id == user_id
-    ).order_by(models.Order.created_at.desc()).all()
-    return orders
+async def get_user_orders(
+    user_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a user's orders newest first, one page at a time"""
+    orders, next_cursor = await keyset_page(
+        db,
+        select(*ORDER_COLUMNS).where(models.Order.user_id == user_id),
+        models.Order, limit, cursor, columns=True
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return ORJSONResponse(await order_rows(db, orders), headers=headers)
 
 
-@router.post("/{user_id}/orders", response_model=schemas.OrderResponse)
-def create_order(user_id: str, order_data: schemas.OrderCreate, db: Session = Depends(get_db)):
-    """Create a new order for a user"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+@router.get("/{user_id}/points", response_model=schemas.PointsBalanceResponse)
+async def get_points_balance(user_id: str, db: AsyncSession = Depends(get_db)):
+    """Get a user's points balance from the ledger"""
+    return schemas.PointsBalanceResponse(
+        user_id=user_id, balance=await ledger_balance(db, user_id)
+    )
 
-    # Validate drinks exist and calculate total
-    total = 0
-    db_items = []
 
-    for item_data in order_data.items:
-        drink = db.query(models.Drink).filter(
-            models.Drink.id == item_data.drink_id,
-            models.Drink.is_active == 1
-        ).first()
+@router.get("/{user_id}/points/history", response_model=List[schemas.PointsEntryResponse])
+async def get_points_history(
+    user_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a user's points changes newest first, each with the resulting balance"""
+    entries, next_cursor = await points_history(db, user_id, limit, cursor)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return ORJSONResponse(entries, headers=headers)
+
+
+def price_order_items(
+    snapshot: CatalogSnapshot, items: List[schemas.OrderItemCreate]
+) -> Tuple[List[dict], float]:
+    """Validate order items against the menu and price them server-side"""
+    rows = []
+    total = 0
+    for item_data in items:
+        drink = snapshot.active_drinks.get(item_data.drink_id)
         if not drink:
             raise HTTPException(
                 status_code=404,
                 detail=f"Drink {item_data.drink_id} not found"
             )
 
-        item_total = item_data.price * item_data.quantity
-        total += item_total
-
-        db_item = models.OrderItem(
-            drink_id=item_data.drink_id,
-            quantity=item_data.quantity,
-            bean_option=item_data.bean_option,
-            milk_option=item_data.milk_option,
-            syrup_option=item_data.syrup_option,
-            price=item_data.price
-        )
-        db_items.append(db_item)
+        bean = snapshot.bean_options.get(item_data.bean_option)
+        milk = snapshot.milk_options.get(item_data.milk_option)
+        syrup = snapshot.syrup_options.get(item_data.syrup_option)
+        for label, option, requested in (
+            ("bean", bean, item_data.bean_option),
+            ("milk", milk, item_data.milk_option),
+            ("syrup", syrup, item_data.syrup_option),
+        ):
+            if not option:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unknown {label} option {requested}"
+                )
+
+        price = drink.price + bean.price + milk.price + syrup.price
+        total += price * item_data.quantity
+
+        rows.append({
+            "id": models.generate_uuid(),
+            "drink_id": drink.id,
+            "quantity": item_data.quantity,
+            "bean_option": bean.name,
+            "milk_option": milk.name,
+            "syrup_option": syrup.name,
+            "price": price,
+        })
+    return rows, total
 
-    # Create order
-    points_earned = calculate_points(total)
 
-    db_order = models.Order(
-        user_id=user_id,
-        total=total,
-        points_earned=points_earned
+@router.post("/{user_id}/orders", response_model=schemas.OrderResponse)
+async def create_order(
+    user_id: str,
+    order_data: schemas.OrderCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=IDEMPOTENCY_KEY_MAX_LENGTH),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create a new order for a user; retries with the same Idempotency-Key return the first result"""
+    if idempotency_key is None:
+        return await place_order(user_id, order_data, db)
+
+    order, replayed = await order_idempotency.run(
+        (user_id, idempotency_key),
+        order_data.model_dump_json().encode(),
+        lambda: place_order(user_id, order_data, db),
     )
-    db_order.items = db_items
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return order
 
-    # Add points to user
-    user.points += points_earned
 
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+async def place_order(
+    user_id: str, order_data: schemas.OrderCreate, db: AsyncSession
+) -> schemas.OrderResponse:
+    user = await db.get(models.User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Validate and price items against the cached menu instead of one
+    # query per item; client-supplied prices are ignored
+    snapshot = await menu_cache.aget()
+    item_rows, total = price_order_items(snapshot, order_data.items)
+
+    # Redeemed points are a discount; points are earned on what is paid.
+    # The balance is checked again, atomically, when the order is written.
+    redeemed = order_data.points_to_redeem
+    if redeemed:
+        if redeemed > (user.points or 0):
+            raise HTTPException(status_code=400, detail="Not enough points")
+        if redeemed * POINT_VALUE > total:
+            raise HTTPException(
+                status_code=400,
+                detail="Cannot redeem more points than the order total"
+            )
+        total = round(total - redeemed * POINT_VALUE, 2)
 
-    return db_order
+    # Create order
+    pending = PendingOrder(
+        user_id=user_id,
+        total=total,
+        points_earned=calculate_points(total),
+        item_rows=item_rows,
+        points_redeemed=redeemed
+    )
+    try:
+        if order_batcher.running:
+            # Group commit: the writer task persists this with other queued
+            # orders. Hand our connection back first so waiters cannot starve
+            # the writer of pool connections.
+            await db.close()
+            await order_batcher.submit(pending)
+        else:
+            await persist_orders(db, [pending])
+            await db.commit()
+    except InsufficientPoints:
+        raise HTTPException(status_code=400, detail="Not enough points")
+    user_cache.invalidate(user_id)
+
+    order = schemas.OrderResponse(
+        id=pending.id,
+        user_id=user_id,
+        total=total,
+        points_earned=pending.points_earned,
+        points_redeemed=redeemed,
+        created_at=pending.created_at,
+        items=[
+            schemas.OrderItemResponse(**row, drink=snapshot.active_drinks[row["drink_id"]])
+            for row in item_rows
+        ]
+    )
+    order_feed.publish(order.model_dump_json().encode())
+    return order
@@ -1,7 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
+# Limits on a single order
+MAX_ITEM_QUANTITY = 99
+MAX_ORDER_ITEMS = 100
+
 
 # Drink schemas
 class DrinkBase(BaseModel):
@@ -40,6 +44,14 @@ class OptionResponse(OptionBase):
         from_attributes = True
 
 
+class MenuResponse(BaseModel):
+    version: str
+    drinks: List[DrinkResponse]
+    beans: List[OptionResponse]
+    milk: List[OptionResponse]
+    syrups: List[OptionResponse]
+
+
 # Order Item schemas
 class OrderItemBase(BaseModel):
     drink_id: str
@@ -51,7 +63,9 @@ class OrderItemBase(BaseModel):
 
 
 class OrderItemCreate(OrderItemBase):
-    pass
+    quantity: int = Field(1, ge=1, le=MAX_ITEM_QUANTITY)
+    # Ignored: item prices are computed server-side from the menu
+    price: Optional[float] = None
 
 
 class OrderItemResponse(OrderItemBase):
@@ -71,10 +85,13 @@ class OrderBase(BaseModel):
 
 class OrderCreate(OrderBase):
     user_id: str
-    items: List[OrderItemCreate]
+    items: List[OrderItemCreate] = Field(..., min_length=1, max_length=MAX_ORDER_ITEMS)
+    # Points to spend as a discount on this order
+    points_to_redeem: int = Field(0, ge=0)
 
 
 class OrderResponse(OrderBase):
+    points_redeemed: int = 0
     id: str
     user_id: str
     created_at: datetime
@@ -98,6 +115,8 @@ class UserCreate(UserBase):
 class UserUpdate(BaseModel):
     name: Optional[str] = None
     points: Optional[int] = None
+    # Balance the client based ``points`` on; the update is rejected if it changed
+    expected_points: Optional[int] = None
     avatar: Optional[str] = None
 
 
@@ -125,6 +144,23 @@ class UserProfileResponse(BaseModel):
     orderHistory: List[OrderHistoryResponse]
     totalSpent: float
     totalPointsEarned: int
+    orderCount: int = 0
+    lastOrderAt: Optional[datetime] = None
+    nextCursor: Optional[str] = None
+
+
+class PointsBalanceResponse(BaseModel):
+    user_id: str
+    balance: int
+
+
+class PointsEntryResponse(BaseModel):
+    id: int
+    delta: int
+    reason: str
+    order_id: Optional[str] = None
+    created_at: datetime
+    balance: int
 
 
 class AdminLogin(BaseModel):
@@ -1,5 +1,18 @@
+import argparse
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import Table
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import Session
+
 import models
+from loyalty import reconcile_user_stats
+from points import OPENING
+from rollups import SalesAggregate, increment_upsert
 
 
 def seed_database(db: Session):
@@ -91,6 +104,9 @@ def seed_database(db: Session):
         points=250
     )
     db.add(default_user)
+    # No relationship links the two, so insert the user before its ledger row
+    db.flush()
+    db.add(models.PointsLedger(user_id="user-1", delta=250, reason=OPENING))
 
     db.commit()
     print("Database seeded successfully!")
@@ -109,7 +125,211 @@ def ensure_default_user(db: Session):
             points=250
         )
         db.add(default_user)
+        db.flush()
+        db.add(models.PointsLedger(user_id="user-1", delta=250, reason=OPENING))
         db.commit()
         print("Default user created")
     else:
         print("Default user already exists")
+
+
+# Relative order volume by hour of day and by weekday (Monday first)
+ORDER_HOUR_WEIGHTS = (0, 0, 0, 0, 0, 0, 2, 6, 10, 9, 6, 5, 7, 7, 5, 4, 4, 5, 4, 3, 2, 1, 0, 0)
+ORDER_WEEKDAY_WEIGHTS = (1.0, 1.0, 1.0, 1.05, 1.15, 1.3, 1.2)
+# Orders per user follow a Pareto distribution: most users order a few
+# times, a few loyal ones hundreds of times
+ORDERS_PER_USER_ALPHA = 1.5
+SYNTHETIC_CHUNK_ORDERS = 20000
+
+
+def synthetic_user_id(index: int) -> str:
+    return f"synthetic-{index:07d}"
+
+
+def synthetic_user_name(index: int) -> str:
+    return f"Гость {index:07d}"
+
+
+# Column order of the tuples seed_synthetic builds
+SYNTHETIC_COLUMNS = (
+    (models.User.__table__, ("id", "name", "points", "created_at")),
+    (models.Order.__table__, ("id", "user_id", "total", "points_earned", "points_redeemed", "created_at")),
+    (models.OrderItem.__table__, (
+        "id", "order_id", "drink_id", "quantity", "bean_option", "milk_option", "syrup_option", "price",
+    )),
+    (models.PointsLedger.__table__, ("user_id", "delta", "reason", "created_at")),
+)
+
+
+def _insert_rows(conn: Connection, table: Table, columns: Tuple[str, ...], rows: List[tuple]):
+    """
+    executemany ``rows`` (tuples of ``columns``, in table order) straight on
+    the DBAPI cursor. Only the column types' bind processors run (datetimes
+    to strings on SQLite), skipping the per-row parameter handling of
+    ``conn.execute(table.insert(), dicts)``, which at this volume costs more
+    than the insert itself.
+    """
+    if not rows:
+        return
+    dialect = conn.dialect
+    compiled = table.insert().compile(dialect=dialect, column_keys=list(columns))
+    for i, name in enumerate(columns):
+        process = table.c[name].type.dialect_impl(dialect).bind_processor(dialect)
+        if process:
+            rows = [row[:i] + (process(row[i]),) + row[i + 1:] for row in rows]
+    if compiled.positiontup is None:
+        rows = [dict(zip(columns, row)) for row in rows]
+    conn.exec_driver_sql(str(compiled), rows)
+
+
+class _OrderClock:
+    """Draws order times with daily and weekly peaks and steady growth"""
+
+    def __init__(self, rng: random.Random, now: datetime, days: int):
+        self.rng = rng
+        self.now = now
+        start = (now - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+        hours = days * 24
+        self.slots, self.cum_weights = [], []
+        total = 0.0
+        for offset in range(hours):
+            slot = start + timedelta(hours=offset)
+            weight = (
+                ORDER_HOUR_WEIGHTS[slot.hour]
+                * ORDER_WEEKDAY_WEIGHTS[slot.weekday()]
+                * (0.6 + 0.4 * offset / hours)
+            )
+            if weight and slot <= now:
+                total += weight
+                self.slots.append(slot)
+                self.cum_weights.append(total)
+
+    def draw(self, count: int) -> List[datetime]:
+        """``count`` order times, oldest first"""
+        rng = self.rng
+        slots = rng.choices(self.slots, cum_weights=self.cum_weights, k=count)
+        return sorted(
+            min(slot + timedelta(seconds=rng.random() * 3600), self.now) for slot in slots
+        )
+
+
+def seed_synthetic(
+    db: Session,
+    users: int,
+    orders_per_user: int,
+    max_items: int = 3,
+    days: int = 90,
+    seed: int = 0,
+):
+    """
+    Bulk-load synthetic users with order history, for benchmarks and
+    profiling at production volume.
+
+    Users get ids synthetic_user_id(0..users-1) and on average
+    ``orders_per_user`` orders over the last ``days``, peaking at breakfast
+    and lunch and towards the weekend. Rows are written with Core
+    executemany in transactions of about SYNTHETIC_CHUNK_ORDERS orders; sales
+    rollups are added up on the way and loyalty aggregates rebuilt at the end.
+    """
+    if db.get(models.User, synthetic_user_id(0)):
+        print("Synthetic users already seeded")
+        return
+
+    rng = random.Random(seed)
+    drinks = db.query(models.Drink).filter(models.Drink.is_active == 1).all()
+    beans, milks, syrups = (
+        db.query(model).all() for model in (models.BeanOption, models.MilkOption, models.SyrupOption)
+    )
+    # Every (drink, bean, milk, syrup) with its unit price, drawn once per item
+    variants = [
+        (drink.id, bean.name, milk.name, syrup.name,
+         drink.price + bean.price + milk.price + syrup.price)
+        for drink, bean, milk, syrup in itertools.product(drinks, beans, milks, syrups)
+    ]
+    db.commit()
+
+    bind = db.get_bind()
+    now = datetime.utcnow()
+    clock = _OrderClock(rng, now, days)
+    scale = orders_per_user * (ORDERS_PER_USER_ALPHA - 1) / ORDERS_PER_USER_ALPHA
+    user_rows, order_rows, item_rows, ledger_rows = chunk = ([], [], [], [])
+    sales = SalesAggregate()
+    order_count = 0
+
+    def flush():
+        with bind.begin() as conn:
+            for (table, columns), rows in zip(SYNTHETIC_COLUMNS, chunk):
+                _insert_rows(conn, table, columns, rows)
+                rows.clear()
+
+    for index in range(users):
+        user_id = synthetic_user_id(index)
+        count = min(int(scale * rng.paretovariate(ORDERS_PER_USER_ALPHA)), orders_per_user * 100)
+        times = clock.draw(count)
+        points = 0
+        for number, created_at in enumerate(times):
+            order_id = f"{user_id}-{number}"
+            items = []
+            for position in range(rng.randint(1, max_items)):
+                drink_id, bean, milk, syrup, price = rng.choice(variants)
+                quantity = 2 if rng.random() < 0.25 else 1
+                items.append({
+                    "drink_id": drink_id, "quantity": quantity, "price": price,
+                    "bean_option": bean, "milk_option": milk, "syrup_option": syrup,
+                })
+                item_rows.append(
+                    (f"{order_id}-{position}", order_id, drink_id, quantity, bean, milk, syrup, price)
+                )
+            total = sum(item["price"] * item["quantity"] for item in items)
+            # Same rule as routes.users.calculate_points
+            points_earned = int(total * 0.1)
+            points += points_earned
+            order_rows.append((order_id, user_id, total, points_earned, 0, created_at))
+            sales.add_order(created_at, total, items)
+        first_seen = times[0] if times else now - timedelta(seconds=rng.random() * days * 86400)
+        user_rows.append((
+            user_id,
+            synthetic_user_name(index),
+            points,
+            first_seen - timedelta(seconds=rng.random() * 86400),
+        ))
+        if points:
+            ledger_rows.append((user_id, points, OPENING, now))
+        order_count += count
+        if len(order_rows) >= SYNTHETIC_CHUNK_ORDERS:
+            flush()
+    flush()
+
+    with bind.begin() as conn:
+        for table, rows in sales.rows():
+            if rows:
+                conn.execute(increment_upsert(conn.dialect.name, table), rows)
+    reconcile_user_stats(db)
+    print(f"Seeded {users} synthetic users, {order_count} orders")
+
+
+if __name__ == "__main__":
+    from database import Base, SessionLocal, engine
+    from migrations import run_migrations
+
+    parser = argparse.ArgumentParser(description="Seed the database")
+    parser.add_argument("--users", type=int, default=0, help="synthetic users to add")
+    parser.add_argument("--orders-per-user", type=int, default=20, help="average orders per user")
+    parser.add_argument("--max-items", type=int, default=3)
+    parser.add_argument("--days", type=int, default=90, help="order history window")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        seed_database(db)
+        if args.users:
+            started = time.perf_counter()
+            seed_synthetic(
+                db, args.users, args.orders_per_user, args.max_items, args.days, args.seed
+            )
+            print(f"Synthetic data loaded in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
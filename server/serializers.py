@@ -0,0 +1,127 @@
+"""
+Fast JSON serialization for the large list endpoints.
+
+Rows are built straight from column tuples and encoded with orjson, skipping
+ORM identity-map work and Pydantic validation. Each builder emits exactly the
+fields, in the same order, as the matching schema in schemas.py, so the wire
+format is unchanged.
+"""
+from typing import Any, Dict, List, Sequence
+
+import orjson
+from fastapi import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+
+class ORJSONResponse(Response):
+    """JSON response rendered with orjson; pre-encoded bytes pass through"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content)
+
+
+DRINK_COLUMNS = (
+    models.Drink.name,
+    models.Drink.description,
+    models.Drink.price,
+    models.Drink.image,
+    models.Drink.id,
+    models.Drink.is_active,
+)
+
+USER_COLUMNS = (
+    models.User.name,
+    models.User.points,
+    models.User.avatar,
+    models.User.id,
+    models.User.created_at,
+)
+
+ORDER_COLUMNS = (
+    models.Order.total,
+    models.Order.points_earned,
+    models.Order.points_redeemed,
+    models.Order.id,
+    models.Order.user_id,
+    models.Order.created_at,
+)
+
+ORDER_ITEM_COLUMNS = (
+    models.OrderItem.drink_id,
+    models.OrderItem.quantity,
+    models.OrderItem.bean_option,
+    models.OrderItem.milk_option,
+    models.OrderItem.syrup_option,
+    models.OrderItem.price,
+    models.OrderItem.id,
+    models.OrderItem.order_id,
+)
+
+
+def drink_row(name, description, price, image, drink_id, is_active) -> Dict[str, Any]:
+    """Same shape as schemas.DrinkResponse"""
+    return {
+        "name": name,
+        "description": description,
+        "price": price,
+        "image": image,
+        "id": drink_id,
+        "is_active": bool(is_active),
+    }
+
+
+def user_row(name, points, avatar, user_id, created_at) -> Dict[str, Any]:
+    """Same shape as schemas.UserResponse"""
+    return {
+        "name": name,
+        "points": points,
+        "avatar": avatar,
+        "id": user_id,
+        "created_at": created_at,
+    }
+
+
+async def order_rows(db: AsyncSession, orders: Sequence) -> List[Dict[str, Any]]:
+    """
+    Build schemas.OrderResponse-shaped dicts for rows selected with
+    ORDER_COLUMNS, loading all their items and drinks in one query.
+    """
+    items_by_order: Dict[str, list] = {order.id: [] for order in orders}
+    if items_by_order:
+        result = await db.execute(
+            select(*ORDER_ITEM_COLUMNS, *DRINK_COLUMNS)
+            .outerjoin(models.Drink, models.Drink.id == models.OrderItem.drink_id)
+            .where(models.OrderItem.order_id.in_(list(items_by_order)))
+        )
+        for row in result:
+            drink_id, quantity, bean, milk, syrup, price, item_id, order_id = row[:8]
+            items_by_order[order_id].append({
+                "drink_id": drink_id,
+                "quantity": quantity,
+                "bean_option": bean,
+                "milk_option": milk,
+                "syrup_option": syrup,
+                "price": float(price),
+                "id": item_id,
+                "order_id": order_id,
+                "drink": drink_row(*row[8:]) if row[12] is not None else None,
+            })
+
+    return [
+        {
+            "total": float(total),
+            "points_earned": points_earned,
+            "points_redeemed": points_redeemed,
+            "id": order_id,
+            "user_id": user_id,
+            "created_at": created_at,
+            "items": items_by_order[order_id],
+        }
+        for total, points_earned, points_redeemed, order_id, user_id, created_at in orders
+    ]
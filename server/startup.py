@@ -0,0 +1,121 @@
+"""
+Worker startup and readiness.
+
+A full startup creates missing tables, applies pending migrations and seeds
+an empty database. With ``FAST_STARTUP`` (on by default) a worker whose
+database already records ``SCHEMA_VERSION`` in ``schema_migrations`` skips
+all of that: one query instead of a table inspection per model, so a restart
+or a new worker against a set-up database starts serving at once.
+
+The worker then warms up in the background, building the menu snapshot and
+opening ``WARM_POOL_CONNECTIONS`` async database connections, and only then
+reports ready. ``GET /health/live`` answers as soon as the process serves
+requests; ``GET /health/ready`` returns 503 until warm-up has finished and
+again once shutdown begins, so a load balancer only routes to warm workers.
+
+Before starting several workers on a new database, prepare it once:
+
+    python startup.py
+"""
+import asyncio
+import os
+import time
+from contextlib import AsyncExitStack
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from database import Base, SessionLocal, async_engine, engine
+from menu_cache import menu_cache, menu_watcher
+from migrations import SCHEMA_VERSION, run_migrations, schema_version
+from seed_data import seed_database
+
+FAST_STARTUP = os.getenv("FAST_STARTUP", "1") == "1"
+WARM_POOL_CONNECTIONS = int(os.getenv("WARM_POOL_CONNECTIONS", "4"))
+
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.state = "starting"
+        self.startup_mode: Optional[str] = None
+        self.started_at = time.monotonic()
+        self.warm_seconds: Optional[float] = None
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "startup": self.startup_mode,
+            "warm_seconds": self.warm_seconds,
+        }
+
+
+readiness = Readiness()
+_warm_task: Optional[asyncio.Task] = None
+
+
+def prepare_database(bind=engine, fast: bool = FAST_STARTUP) -> str:
+    """Bring the schema and seed data up to date; returns "fast" or "full" """
+    if fast:
+        with bind.connect() as conn:
+            if schema_version(conn) == SCHEMA_VERSION:
+                return "fast"
+    Base.metadata.create_all(bind=bind)
+    run_migrations(bind)
+    db = SessionLocal()
+    try:
+        seed_database(db)
+    finally:
+        db.close()
+    return "full"
+
+
+async def warm_pool(count: int = WARM_POOL_CONNECTIONS):
+    """Open up to ``count`` pooled async connections so first requests reuse them"""
+    pool = async_engine.sync_engine.pool
+    if hasattr(pool, "size"):
+        count = min(count, pool.size())
+    async with AsyncExitStack() as stack:
+        for _ in range(count):
+            conn = await stack.enter_async_context(async_engine.connect())
+            await conn.execute(text("SELECT 1"))
+
+
+async def warm_up():
+    try:
+        await run_in_threadpool(menu_cache.get)
+        await warm_pool()
+    except Exception as exc:
+        # Stay unready; the orchestrator's health check restarts the worker
+        readiness.state = "warm-up failed"
+        print(f"Warm-up failed: {exc!r}")
+        return
+    readiness.warm_seconds = round(time.monotonic() - readiness.started_at, 3)
+    readiness.ready = True
+    readiness.state = "ready"
+
+
+async def start():
+    """Startup hook: prepare the database, then warm up without blocking serving"""
+    global _warm_task
+    readiness.startup_mode = await run_in_threadpool(prepare_database)
+    readiness.state = "warming"
+    _warm_task = asyncio.create_task(warm_up())
+    menu_watcher.start()
+
+
+async def stop():
+    """Shutdown hook: stop reporting ready before connections are closed"""
+    readiness.ready = False
+    readiness.state = "stopping"
+    if _warm_task is not None and not _warm_task.done():
+        _warm_task.cancel()
+    await menu_watcher.stop()
+
+
+if __name__ == "__main__":
+    # Run once before starting several workers, so they do not race to
+    # create the schema and seed a new database
+    print(f"Database ready ({prepare_database(fast=False)} check)")